@@ -1,25 +1,43 @@
-# pip install bleak bthome-ble
+# pip install bleak bthome-ble numpy
 
 '''
 quick_read_and_save() 函数适合自动化脚本调用
 get_latest_reading() 函数获取最新一条数据
 clear_all_data() 函数清空所有数据
+poll_devices() 多设备轮询模式，限制同时连接数，失败退避，读数变化快时加密采样
+scan_advertisements() 广播扫描模式，不连接设备即可同时采集多台（ATC/pvvx/BTHome 固件）
 日常使用：运行 main() 进入交互菜单
 自动化脚本：调用 asyncio.run(quick_read_and_save())
-数据存储：每次读取的温湿度会保存为同一行，数据库永远只保留3条最新记录
+数据存储：每次读取的温湿度会保存为同一行；原始数据保留 RAW_RETENTION_DAYS 天，
+          并定期增量汇总为 1分钟/1小时/1天 的最小/最大/平均值，按各层保留期清理
 '''
 
 
 import asyncio
-from bleak import BleakClient
+from bleak import BleakClient, BleakScanner
+from bthome_ble.const import MEAS_TYPES
 from datetime import datetime
+import numpy as np
 import struct
-import sqlite3
 import json
 from typing import List, Dict, Optional
 import os
+import random
+import time
 
-from services.config import DEVICE_MAC
+from services.config import (
+    DEVICE_MAC, DEVICES, DB_PATH, RAW_RETENTION_DAYS, TIER_RETENTION_DAYS, COMPACT_INTERVAL, COMPACT_LAG,
+    WRITE_BATCH_SIZE, WRITE_FLUSH_INTERVAL, WRITE_QUEUE_SIZE, IMPORT_CHUNK_SIZE, ADV_MIN_INTERVAL, ADV_LOG_FILE,
+    POLL_MAX_CONNECTIONS, POLL_INTERVAL, POLL_MIN_INTERVAL, POLL_MAX_BACKOFF, POLL_TIMEOUT,
+    POLL_CHANGE_TEMPERATURE, POLL_CHANGE_HUMIDITY, MONITOR_MAX_BACKOFF, MONITOR_HEALTH_INTERVAL,
+    SENSOR_METRICS_PORT, SENSOR_METRICS_HOST,
+)
+from services import metrics
+from services.metrics import track, SENSOR_WRITES, UPSTREAM_ERRORS
+from services.get_db import (
+    get_connection, get_history, init_schema, to_epoch_ms, bucket_sql, SELECT_RECENT, SELECT_LATEST, TIERS,
+    LOCAL_OFFSET_MS,
+)
 
 
 # 设备信息（根据你的发现）
@@ -34,152 +52,403 @@ HUMIDITY_CHAR = "00002a6f-0000-1000-8000-00805f9b34fb"    # 湿度
 BATTERY_SERVICE = "0000180f-0000-1000-8000-00805f9b34fb"   # 电池服务
 BATTERY_CHAR = "00002a19-0000-1000-8000-00805f9b34fb"      # 电池电平
 
+# 广播数据的服务UUID（ATC/pvvx 自定义格式使用环境传感服务 0x181A）
+BTHOME_SERVICE = "0000fcd2-0000-1000-8000-00805f9b34fb"    # BTHome v2
+
+
+INSERT_READING = '''
+INSERT INTO sensor_readings 
+(ts, device_mac, temperature, humidity, battery)
+VALUES (?, ?, ?, ?, ?)
+'''
+
+# 与插入在同一事务中执行；乱序到达的旧数据不会覆盖更新的数据
+UPSERT_LATEST = '''
+INSERT INTO sensor_latest 
+(device_mac, ts, temperature, humidity, battery)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT(device_mac) DO UPDATE SET
+    ts = excluded.ts,
+    temperature = excluded.temperature,
+    humidity = excluded.humidity,
+    battery = excluded.battery
+WHERE excluded.ts >= sensor_latest.ts
+'''
+
+UPSERT_HEALTH = '''
+INSERT OR REPLACE INTO sensor_health 
+(device_mac, connected, last_packet, reconnects, last_error, updated)
+VALUES (?, ?, ?, ?, ?, ?)
+'''
+
 class SensorDatabase:
-    """SQLite数据库管理器 - 仅保存最近3组数据"""
+    """SQLite数据库管理器 - 原始数据 + 1分钟/1小时/1天 降采样汇总"""
     
-    def __init__(self, db_path: str = "sensor_data.db", max_records: int = 3):
+    def __init__(self, db_path: str = DB_PATH, max_records: Optional[int] = None):
         self.db_path = db_path
-        self.max_records = max_records  # 最大保存记录数
+        self.max_records = max_records  # 原始表最大记录数，None 表示只按保留天数清理
+        self._last_compact = 0.0
         self.init_database()
     
     def init_database(self):
-        """初始化数据库和表结构"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # 创建传感器数据表（简化版）
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS sensor_readings (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,
-            device_mac TEXT NOT NULL,
-            temperature REAL,
-            humidity REAL,
-            battery INTEGER
-        )
-        ''')
+        """初始化数据库和表结构，必要时迁移旧版结构"""
+        init_schema(self.db_path)
         
-        # 创建索引以提高查询性能
-        cursor.execute('''
-        CREATE INDEX IF NOT EXISTS idx_timestamp ON sensor_readings(timestamp)
-        ''')
-        
-        conn.commit()
-        conn.close()
-        print(f"✓ 数据库已初始化: {self.db_path} (最多保存{self.max_records}条记录)")
+        limit = f"最多保存{self.max_records}条原始记录" if self.max_records else f"原始数据保留{RAW_RETENTION_DAYS}天"
+        print(f"✓ 数据库已初始化: {self.db_path} ({limit})")
     
     def save_reading(self, data: Dict) -> bool:
         """
-        保存传感器数据到数据库，并确保只保留最近3组数据
+        保存传感器数据到数据库，并在同一事务中更新该设备的最新读数
+        插入本身为 O(1)；距上次汇总超过 COMPACT_INTERVAL 时顺带执行一次增量汇总
         
         Args:
-            data: 包含传感器数据的字典
+            data: 包含传感器数据的字典，时间可用 ts（毫秒）或 timestamp（ISO-8601）
             
         Returns:
             是否保存成功
         """
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # 准备数据
-            timestamp = data.get("timestamp", datetime.now().isoformat())
-            device_mac = data.get("device_mac", DEVICE_MAC)
-            temperature = data.get("temperature")
-            humidity = data.get("humidity")
-            battery = data.get("battery")
-            
-            # 插入新数据
-            cursor.execute('''
-            INSERT INTO sensor_readings 
-            (timestamp, device_mac, temperature, humidity, battery)
-            VALUES (?, ?, ?, ?, ?)
-            ''', (timestamp, device_mac, temperature, humidity, battery))
-            
-            # 检查并清理超出限制的旧数据
-            self._cleanup_old_data(cursor)
-            
-            conn.commit()
-            conn.close()
+        if not self.save_readings([data]):
+            return False
+        print(f"✓ 数据已保存到数据库")
+        return True
+    
+    def save_readings(self, readings: List[Dict], compact: bool = True) -> bool:
+        """
+        在一个事务中批量保存多条传感器数据（executemany，只提交一次）
+        
+        Args:
+            readings: save_reading 所用格式的字典列表
+            compact: 是否按 COMPACT_INTERVAL 顺带汇总；批量导入时关闭，导入完成后调用 compact(since=...)
             
-            print(f"✓ 数据已保存到数据库")
+        Returns:
+            是否保存成功（失败时整批回滚）
+        """
+        if not readings:
             return True
+        with track("sqlite", "save_readings") as tracked:
+            try:
+                conn = get_connection(self.db_path)
+                
+                # 准备数据
+                rows = [
+                    (to_epoch_ms(data.get("ts", data.get("timestamp"))), data.get("device_mac", DEVICE_MAC),
+                     data.get("temperature"), data.get("humidity"), data.get("battery"))
+                    for data in readings
+                ]
+                
+                # 插入新数据（出错自动回滚）
+                with conn:
+                    cursor = conn.cursor()
+                    cursor.executemany(INSERT_READING, rows)
+                    # 同一设备按时间顺序更新，UPSERT 的条件保证只保留最新的一条
+                    cursor.executemany(UPSERT_LATEST, [(mac, ts, t, h, b) for ts, mac, t, h, b in sorted(rows, key=lambda row: row[0])])
+                    
+                    # 限制原始表大小：id 自增，按主键删除即可，无需统计总数
+                    if self.max_records:
+                        cursor.execute('DELETE FROM sensor_readings WHERE id <= '
+                                       '(SELECT MAX(id) FROM sensor_readings) - ?', (self.max_records,))
+            except Exception as e:
+                print(f"✗ 保存数据失败: {e}")
+                tracked.fail()
+                return False
+        
+        if compact and time.monotonic() - self._last_compact >= COMPACT_INTERVAL:
+            self.compact()
+        return True
+    
+    def import_records(self, records: Dict[str, np.ndarray], device_mac: Optional[str] = None) -> int:
+        """
+        批量导入 decode_records 解码出的一块数据（一个事务），并更新各设备的最新读数
+        不触发汇总，导入全部完成后应调用 compact(since=最早时间) 重新汇总
+        
+        Args:
+            records: decode_records 的返回值
+            device_mac: 记录中不含设备地址时使用的设备地址
             
+        Returns:
+            导入的条数
+        """
+        n = len(records["ts"])
+        if n == 0:
+            return 0
+        macs = records.get("device_mac")
+        if macs is None:
+            macs = np.full(n, device_mac or DEVICE_MAC, dtype=object)
+        # 缺失值（NaN）转换为 None
+        battery = records["battery"].astype(object)
+        battery[np.isnan(records["battery"])] = None
+        columns = (records["ts"].tolist(), macs.tolist(), records["temperature"].tolist(),
+                   records["humidity"].tolist(), battery.tolist())
+        
+        # 每台设备本块中时间最新的一条
+        order = np.lexsort((records["ts"], macs.astype(str)))
+        last = order[np.r_[macs[order][1:] != macs[order][:-1], True]]
+        
+        conn = get_connection(self.db_path)
+        with conn:
+            conn.executemany(INSERT_READING, zip(*columns))
+            conn.executemany(UPSERT_LATEST, [
+                (columns[1][i], columns[0][i], columns[2][i], columns[3][i], columns[4][i]) for i in last.tolist()
+            ])
+        return n
+    
+    def save_health(self, health: Dict) -> bool:
+        """保存一台设备的连接状态（覆盖旧值）"""
+        try:
+            conn = get_connection(self.db_path)
+            with conn:
+                conn.execute(UPSERT_HEALTH, (health["device_mac"], health["connected"], health["last_packet"],
+                                             health["reconnects"], health["last_error"], to_epoch_ms()))
+            return True
         except Exception as e:
-            print(f"✗ 保存数据失败: {e}")
+            print(f"✗ 保存连接状态失败: {e}")
             return False
     
-    def _cleanup_old_data(self, cursor):
-        """清理超出最大记录数的旧数据"""
-        # 获取总记录数
-        cursor.execute('SELECT COUNT(*) FROM sensor_readings')
-        count = cursor.fetchone()[0]
+    def _watermark(self, conn, tier: str) -> int:
+        row = conn.execute('SELECT watermark FROM compaction_state WHERE tier = ?', (tier,)).fetchone()
+        return row['watermark'] if row else 0
+    
+    def compact(self, since=None):
+        """
+        增量汇总并按保留期清理
+        每层只处理自身水位线之后、上一层水位线之前的完整时间桶，
+        1分钟层由原始表汇总，1小时层由1分钟层汇总，1天层由1小时层汇总。
         
-        # 如果超过最大记录数，删除最旧的记录
-        if count > self.max_records:
-            delete_count = count - self.max_records
-            cursor.execute(f'''
-            DELETE FROM sensor_readings 
-            WHERE id IN (
-                SELECT id FROM sensor_readings 
-                ORDER BY timestamp ASC 
-                LIMIT {delete_count}
-            )
-            ''')
-            print(f"✓ 已清理 {delete_count} 条旧数据，保留最近 {self.max_records} 条")
+        补录时，上一层已按保留期清理掉的时间桶无法完整重建，这些桶只补充原来没有的，
+        已有的汇总结果保持不变；上一层仍完整保留的时间桶整体重新汇总
+        
+        Args:
+            since: 补录历史数据后，从该时间（毫秒时间戳或 ISO-8601）起重新汇总
+        """
+        self._last_compact = time.monotonic()
+        conn = get_connection(self.db_path)
+        now = to_epoch_ms()
+        try:
+            with conn:
+                # 各层可以整体重建的起点：上一层在此之后的数据都还在（未超过保留期或尚未被本层汇总）
+                complete = {}
+                retention = RAW_RETENTION_DAYS
+                for name, size in TIERS:
+                    kept = 0
+                    if retention is not None:
+                        # 保留期起点向后取整到本层时间桶，跨越起点的桶已不完整
+                        expire = now - retention * 86400 * 1000 + LOCAL_OFFSET_MS
+                        kept = -(-expire // size) * size - LOCAL_OFFSET_MS
+                    complete[name] = min(self._watermark(conn, name), kept)
+                    retention = TIER_RETENTION_DAYS.get(name)
+                
+                if since is not None:
+                    since = to_epoch_ms(since)
+                    for name, size in TIERS:
+                        conn.execute(f'''
+                        UPDATE compaction_state SET watermark = {bucket_sql("?", size)}
+                        WHERE tier = ? AND watermark > ?
+                        ''', (since, name, since))
+                
+                # 原始表的“水位线”：只汇总 COMPACT_LAG 之前的数据
+                source_watermark = now - COMPACT_LAG * 1000
+                source = None
+                for name, size in TIERS:
+                    start = self._watermark(conn, name)
+                    cutoff = (source_watermark + LOCAL_OFFSET_MS) // size * size - LOCAL_OFFSET_MS
+                    # 上一层已不完整的部分只插入新的时间桶（OR IGNORE），其余部分重建（OR REPLACE）
+                    boundary = min(max(start, complete[name]), cutoff)
+                    for mode, begin, end in (("IGNORE", start, boundary), ("REPLACE", boundary, cutoff)):
+                        if end <= begin:
+                            continue
+                        if source is None:
+                            conn.execute(f'''
+                            INSERT OR {mode} INTO sensor_readings_{name}
+                            (device_mac, bucket, temp_min, temp_max, temp_avg, hum_min, hum_max, hum_avg, battery, count)
+                            SELECT device_mac, {bucket_sql("ts", size)} AS b,
+                                   MIN(temperature), MAX(temperature), AVG(temperature),
+                                   MIN(humidity), MAX(humidity), AVG(humidity), MIN(battery), COUNT(*)
+                            FROM sensor_readings
+                            WHERE ts >= ? AND ts < ?
+                            GROUP BY device_mac, b
+                            ''', (begin, end))
+                        else:
+                            conn.execute(f'''
+                            INSERT OR {mode} INTO sensor_readings_{name}
+                            (device_mac, bucket, temp_min, temp_max, temp_avg, hum_min, hum_max, hum_avg, battery, count)
+                            SELECT device_mac, {bucket_sql("bucket", size)} AS b,
+                                   MIN(temp_min), MAX(temp_max), SUM(temp_avg * count) / SUM(count),
+                                   MIN(hum_min), MAX(hum_max), SUM(hum_avg * count) / SUM(count),
+                                   MIN(battery), SUM(count)
+                            FROM sensor_readings_{source}
+                            WHERE bucket >= ? AND bucket < ?
+                            GROUP BY device_mac, b
+                            ''', (begin, end))
+                    if cutoff > start:
+                        conn.execute('INSERT OR REPLACE INTO compaction_state (tier, watermark) VALUES (?, ?)',
+                                     (name, cutoff))
+                    source, source_watermark = name, max(cutoff, start)
+                
+                # 按保留期清理；尚未被更粗一层汇总的数据不删除
+                layers = [("sensor_readings", "ts", RAW_RETENTION_DAYS)] + [
+                    (f"sensor_readings_{name}", "bucket", TIER_RETENTION_DAYS.get(name)) for name, _ in TIERS
+                ]
+                consumers = [name for name, _ in TIERS] + [None]
+                for (table, column, days), consumer in zip(layers, consumers):
+                    if days is None:
+                        continue
+                    expire = now - days * 86400 * 1000
+                    if consumer is not None:
+                        expire = min(expire, self._watermark(conn, consumer))
+                    conn.execute(f'DELETE FROM {table} WHERE {column} < ?', (expire,))
+        except Exception as e:
+            print(f"✗ 汇总数据失败: {e}")
     
     def get_recent_readings(self, limit: int = None) -> List[Dict]:
         """
         获取最近的传感器读数
         
         Args:
-            limit: 返回的记录数，None表示返回所有（最多3条）
+            limit: 返回的记录数，None表示最近3条
             
         Returns:
             传感器数据列表，按时间倒序排列
         """
         if limit is None:
-            limit = self.max_records
+            limit = 3
             
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row  # 使返回结果为字典形式
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-        SELECT * FROM sensor_readings 
-        ORDER BY timestamp DESC 
-        LIMIT ?
-        ''', (limit,))
-        
-        rows = cursor.fetchall()
-        conn.close()
-        
-        # 转换为字典列表
-        result = []
-        for row in rows:
-            row_dict = dict(row)
-            result.append(row_dict)
+        conn = get_connection(self.db_path)  # 返回结果为字典形式
+        return conn.execute(SELECT_RECENT, (limit,)).fetchall()
+    
+    def get_history(self, start: str, end: Optional[str] = None, device_mac: Optional[str] = None,
+                    max_points: int = 500) -> Dict:
+        """
+        查询时间范围内的历史数据，自动选择能回答查询的最粗汇总层
         
-        return result
+        Returns:
+            {"tier": 使用的层级, "points": 按时间升序的数据点}
+        """
+        return get_history(start, end, device_mac, max_points, self.db_path)
     
     def get_latest_reading(self) -> Optional[Dict]:
-        """获取最新的一组数据"""
-        readings = self.get_recent_readings(limit=1)
-        return readings[0] if readings else None
+        """获取最新的一组数据（读 sensor_latest，与历史数据量无关）"""
+        conn = get_connection(self.db_path)
+        return conn.execute(SELECT_LATEST).fetchone()
     
     def clear_all_data(self):
         """清空所有数据"""
         confirm = input("确定要清空所有数据吗？(y/N): ").strip().lower()
         if confirm == 'y':
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('DELETE FROM sensor_readings')
-            conn.commit()
-            conn.close()
+            conn = get_connection(self.db_path)
+            with conn:
+                conn.execute('DELETE FROM sensor_readings')
+                conn.execute('DELETE FROM sensor_latest')
+                conn.execute('DELETE FROM sensor_health')
+                for name, _ in TIERS:
+                    conn.execute(f'DELETE FROM sensor_readings_{name}')
+                conn.execute('DELETE FROM compaction_state')
             print("✓ 所有数据已清空")
             return True
         return False
 
+class BatchWriter:
+    """
+    异步写入缓冲（write-behind）
+    蓝牙回调只把读数放入队列，后台任务攒够 batch_size 条或等待 flush_interval 秒后
+    在线程中一次性写入（一个事务、一次 fsync），不阻塞事件循环。
+    队列有上限：磁盘慢时 put() 会等待，submit() 会丢弃并计数，形成背压。
+    
+    用法：
+        async with BatchWriter(db) as writer:
+            writer.submit(data)        # 同步回调中使用
+            await writer.put(data)     # 协程中使用
+    """
+    
+    def __init__(self, db: SensorDatabase, batch_size: int = WRITE_BATCH_SIZE,
+                 flush_interval: float = WRITE_FLUSH_INTERVAL, max_pending: int = WRITE_QUEUE_SIZE):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = asyncio.Queue(max_pending)
+        self.written = 0   # 已写入的条数
+        self.dropped = 0   # 队列满时丢弃的条数
+        self.failed = 0    # 写入失败的条数
+        self._task = None
+    
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        return self
+    
+    async def close(self):
+        """停止后台任务，并把队列中剩余的数据全部写入"""
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        # 结束标记排在已有数据之后，队列满时等待写入追上
+        await self.queue.put(None)
+        await task
+        await self._drain()
+    
+    async def __aenter__(self):
+        return self.start()
+    
+    async def __aexit__(self, *exc):
+        await self.close()
+    
+    def submit(self, data: Dict) -> bool:
+        """非阻塞地加入队列（供同步回调使用），队列已满时丢弃并返回 False"""
+        try:
+            self.queue.put_nowait(data)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            SENSOR_WRITES.inc("dropped")
+            print(f"✗ 写入队列已满，丢弃一条数据（共丢弃 {self.dropped} 条）")
+            return False
+    
+    async def put(self, data: Dict):
+        """加入队列，队列已满时等待写入追上"""
+        await self.queue.put(data)
+    
+    async def _flush(self, batch: List[Dict]):
+        if not batch:
+            return
+        if await asyncio.to_thread(self.db.save_readings, batch):
+            self.written += len(batch)
+            SENSOR_WRITES.inc("written", amount=len(batch))
+        else:
+            self.failed += len(batch)
+            SENSOR_WRITES.inc("failed", amount=len(batch))
+    
+    async def _drain(self):
+        batch = []
+        while not self.queue.empty():
+            item = self.queue.get_nowait()
+            if item is not None:
+                batch.append(item)
+        await self._flush(batch)
+    
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            closing = False
+            # 攒批：够 batch_size 条或到达时间就写入
+            while len(batch) < self.batch_size:
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), max(deadline - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    closing = True
+                    break
+                batch.append(item)
+            # 写入期间队列继续接收新数据，写满后生产者开始等待
+            await self._flush(batch)
+            if closing:
+                return
+
 def parse_temperature(data: bytes) -> float:
     """
     解析温度数据 (特征值 0x2A6E)
@@ -211,18 +480,260 @@ def parse_battery(data: bytes) -> int:
         return data[0]
     raise ValueError("电池数据长度不足")
 
-async def read_sensor_data():
-    """连接设备并读取温湿度数据"""
-    print(f"正在连接设备 {DEVICE_MAC}...")
+# 批量解码的记录格式（紧凑排列的结构化 dtype）
+# pvvx-memo: pvvx 固件历史记录导出，时间为秒，无设备地址
+# pvvx-adv / atc-adv: 录制的自定义广播，每条前加 8 字节小端毫秒时间戳
+RECORD_DTYPES = {
+    "pvvx-memo": np.dtype([("cmd", "u1"), ("index", "<u2"), ("time", "<u4"),
+                           ("temperature", "<i2"), ("humidity", "<u2"), ("voltage", "<u2")]),
+    "pvvx-adv": np.dtype([("ts", "<i8"), ("mac", "u1", 6), ("temperature", "<i2"), ("humidity", "<u2"),
+                          ("voltage", "<u2"), ("battery", "u1"), ("counter", "u1"), ("flags", "u1")]),
+    "atc-adv": np.dtype([("ts", "<i8"), ("mac", "u1", 6), ("temperature", ">i2"), ("humidity", "u1"),
+                         ("battery", "u1"), ("voltage", ">u2"), ("counter", "u1")]),
+}
+
+# 各格式的温度/湿度单位
+_RECORD_SCALES = {
+    "pvvx-memo": (0.01, 0.01),
+    "pvvx-adv": (0.01, 0.01),
+    "atc-adv": (0.1, 1.0),
+}
+
+def decode_records(buffer, fmt: str) -> Dict[str, np.ndarray]:
+    """
+    把多条定长记录拼接成的字节串一次性解码为 NumPy 数组（np.frombuffer，不逐条解析）
     
-    async with BleakClient(DEVICE_MAC) as client:
+    Args:
+        buffer: 记录字节串，长度须为记录长度的整数倍
+        fmt: RECORD_DTYPES 中的格式名
+        
+    Returns:
+        {"ts": 毫秒时间戳, "temperature", "humidity", "battery": 缺失为 NaN,
+         "device_mac": 设备地址（记录中不含时为 None）}
+    """
+    records = np.frombuffer(buffer, dtype=RECORD_DTYPES[fmt])
+    temp_scale, hum_scale = _RECORD_SCALES[fmt]
+    result = {
+        "ts": records["ts"] if "ts" in records.dtype.names else records["time"].astype(np.int64) * 1000,
+        "temperature": np.round(records["temperature"] * temp_scale, 2),
+        "humidity": np.round(records["humidity"] * hum_scale, 2),
+        "battery": (records["battery"].astype(np.float64) if "battery" in records.dtype.names
+                    else np.full(len(records), np.nan)),
+        "device_mac": None,
+    }
+    if "mac" in records.dtype.names:
+        # pvvx 广播中的地址为倒序；相同地址只格式化一次
+        mac = records["mac"][:, ::-1] if fmt == "pvvx-adv" else records["mac"]
+        unique, inverse = np.unique(np.ascontiguousarray(mac).view("V6").ravel(), return_inverse=True)
+        names = np.array([bytes(v).hex(":").upper() for v in unique], dtype=object)
+        result["device_mac"] = names[inverse]
+    return result
+
+def iter_record_chunks(path: str, fmt: str, chunk_size: int = IMPORT_CHUNK_SIZE):
+    """按块读取记录文件并解码，内存占用与文件大小无关；末尾不完整的记录被忽略"""
+    itemsize = RECORD_DTYPES[fmt].itemsize
+    with open(path, 'rb') as f:
+        while True:
+            buffer = f.read(itemsize * chunk_size)
+            usable = len(buffer) - len(buffer) % itemsize
+            if usable == 0:
+                return
+            yield decode_records(buffer[:usable], fmt)
+
+# ATC1441 自定义广播（13字节，大端）: MAC, 温度0.1°C, 湿度%, 电量%, 电压mV, 帧计数
+_ATC1441_FORMAT = struct.Struct('>6shBBHB')
+# pvvx 自定义广播（15字节，小端）: MAC(倒序), 温度0.01°C, 湿度0.01%, 电压mV, 电量%, 帧计数, 标志
+_PVVX_FORMAT = struct.Struct('<6shHHBBB')
+
+# BTHome v2 对象ID -> 读数字段，长度与系数取自 bthome-ble
+_BTHOME_FIELDS = {
+    0x00: "packet_id",
+    0x01: "battery",
+    0x02: "temperature",  # 0.01°C
+    0x03: "humidity",     # 0.01%
+    0x2E: "humidity",     # 1%
+    0x45: "temperature",  # 0.1°C
+}
+
+def parse_atc_advertisement(data: bytes) -> Optional[Dict]:
+    """
+    解析 ATC/pvvx 固件的自定义广播（服务数据 0x181A），按长度区分格式
+    返回 {"temperature", "humidity", "battery", "packet_id"}，格式不符返回 None
+    """
+    if len(data) == _ATC1441_FORMAT.size:
+        _, temp, hum, battery, _, counter = _ATC1441_FORMAT.unpack(data)
+        return {"temperature": temp / 10.0, "humidity": float(hum), "battery": battery, "packet_id": counter}
+    if len(data) == _PVVX_FORMAT.size:
+        _, temp, hum, _, battery, counter, _ = _PVVX_FORMAT.unpack(data)
+        return {"temperature": temp / 100.0, "humidity": hum / 100.0, "battery": battery, "packet_id": counter}
+    return None
+
+def parse_bthome_advertisement(data: bytes) -> Optional[Dict]:
+    """
+    解析未加密的 BTHome v2 广播（服务数据 0xFCD2）
+    遇到未知对象ID时停止解析；缺少温度或湿度返回 None
+    """
+    if not data or data[0] & 0x01 or data[0] >> 5 != 2:  # 加密或非 v2
+        return None
+    reading = {}
+    i = 1
+    while i < len(data):
+        meas = MEAS_TYPES.get(data[i])
+        end = i + 1 + (meas.data_length if meas else 0)
+        if meas is None or end > len(data):
+            break
+        field = _BTHOME_FIELDS.get(data[i])
+        if field and field not in reading:
+            value = int.from_bytes(data[i + 1:end], 'little', signed=meas.data_format == "signed_integer")
+            reading[field] = round(value * meas.factor, 2)
+        i = end
+    if "temperature" not in reading or "humidity" not in reading:
+        return None
+    if "battery" in reading:
+        reading["battery"] = int(reading["battery"])
+    return reading
+
+def parse_advertisement(service_data: Dict[str, bytes]) -> Optional[Dict]:
+    """
+    从广播的服务数据 {UUID: 字节} 中解析温湿度，支持 ATC1441 / pvvx / BTHome v2
+    """
+    data = service_data.get(BTHOME_SERVICE)
+    if data is not None:
+        return parse_bthome_advertisement(data)
+    data = service_data.get(ENVIRONMENTAL_SENSING_SERVICE)
+    if data is not None:
+        return parse_atc_advertisement(data)
+    return None
+
+
+class AdvertisementFilter:
+    """
+    广播去重：同一设备的同一帧会被重复广播多次，
+    帧计数未变化时丢弃；变化后距上次保存不足 min_interval 秒也丢弃。
+    没有帧计数的广播（BTHome 可省略 packet id）只按 min_interval 去重
+    """
+    
+    def __init__(self, min_interval: float = ADV_MIN_INTERVAL):
+        self.min_interval = min_interval
+        self._last = {}  # MAC -> (帧计数, 保存时间)
+    
+    def accept(self, mac: str, reading: Dict, now: Optional[float] = None) -> bool:
+        now = time.monotonic() if now is None else now
+        last = self._last.get(mac)
+        if last is not None:
+            packet_id, saved_at = last
+            if now - saved_at < self.min_interval:
+                return False
+            if packet_id is not None and reading.get("packet_id") == packet_id:
+                return False
+        self._last[mac] = (reading.get("packet_id"), now)
+        return True
+
+
+def decode_advertisement(mac: str, service_data: Dict[str, bytes], ts: Optional[int] = None) -> Optional[Dict]:
+    """解析一条广播并补上设备和时间，得到可直接写入数据库的读数"""
+    reading = parse_advertisement(service_data)
+    if reading is None:
+        return None
+    reading["device_mac"] = mac
+    reading["ts"] = to_epoch_ms(ts)
+    return reading
+
+def replay_advertisements(path: str = ADV_LOG_FILE) -> List[Dict]:
+    """
+    离线解析录制的广播（JSONL，每行 {"ts", "mac", "service_data": {UUID: 十六进制}}），
+    按录制时的去重规则返回读数列表，用于调试解析或补录数据
+    """
+    readings = []
+    adv_filter = AdvertisementFilter()
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                item = json.loads(line)
+                service_data = {uuid: bytes.fromhex(value) for uuid, value in item["service_data"].items()}
+            except (ValueError, KeyError, AttributeError):
+                continue
+            reading = decode_advertisement(item["mac"], service_data, item.get("ts"))
+            if reading and adv_filter.accept(item["mac"], reading, reading["ts"] / 1000):
+                readings.append(reading)
+    return readings
+
+async def scan_advertisements(db: SensorDatabase, devices: List[str] = DEVICES,
+                              duration: Optional[float] = None, record_path: Optional[str] = None):
+    """
+    广播扫描模式：不建立连接，同时接收多台设备广播的温湿度，去重后经写入缓冲保存
+    
+    Args:
+        devices: 需要采集的设备MAC列表
+        duration: 扫描时长（秒），None 表示一直运行直到 Ctrl+C
+        record_path: 把原始广播追加写入该 JSONL 文件，可用 replay_advertisements 离线解析
+    """
+    wanted = {mac.upper() for mac in devices}
+    adv_filter = AdvertisementFilter()
+    record = open(record_path, 'a', encoding='utf-8') if record_path else None
+    print(f"启动广播扫描，设备: {', '.join(sorted(wanted))}")
+    
+    async with BatchWriter(db) as writer:
+        def on_advertisement(device, advertisement):
+            mac = device.address.upper()
+            if mac not in wanted or not advertisement.service_data:
+                return
+            ts = to_epoch_ms()
+            if record:
+                record.write(json.dumps({"ts": ts, "mac": mac, "service_data": {
+                    uuid: value.hex() for uuid, value in advertisement.service_data.items()
+                }}) + "\n")
+            try:
+                reading = decode_advertisement(mac, advertisement.service_data, ts)
+            except Exception as e:
+                print(f"解析广播失败 {mac}: {e}")
+                return
+            if reading and adv_filter.accept(mac, reading):
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] {mac} 🌡️ {reading['temperature']:.2f}°C "
+                      f"💧 {reading['humidity']:.2f}%")
+                reading.pop("packet_id", None)
+                writer.submit(reading)
+        
+        try:
+            async with BleakScanner(detection_callback=on_advertisement):
+                print("扫描中... 按Ctrl+C停止")
+                print("-" * 40)
+                if duration is None:
+                    await asyncio.Event().wait()
+                else:
+                    await asyncio.sleep(duration)
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            print("\n停止扫描...")
+        finally:
+            if record:
+                record.close()
+    print(f"✓ 共保存 {writer.written} 条数据")
+
+async def read_sensor_data(device_mac: str = DEVICE_MAC, client_factory=BleakClient):
+    """
+    连接设备并在同一次连接中读取温度、湿度和电量，返回 None 或抛出异常时计入读取失败
+    
+    Args:
+        device_mac: 设备地址
+        client_factory: 以设备地址创建蓝牙客户端的可调用对象（默认 BleakClient，测试时可替换）
+    """
+    with track("ble", "read") as tracked:
+        data = await _read_sensor_data(device_mac, client_factory)
+        if data is None:
+            tracked.fail()
+        return data
+
+async def _read_sensor_data(device_mac: str, client_factory):
+    print(f"正在连接设备 {device_mac}...")
+    
+    async with client_factory(device_mac) as client:
         # 检查连接状态
         if not client.is_connected:
             print("连接失败")
             return None
         
         print("✓ 设备已连接")
-        print(f"设备名称: {await client.get_device_name()}")
+        print(f"设备名称: {client.name}")
         
         temperature = None
         humidity = None
@@ -268,75 +779,238 @@ async def read_sensor_data():
                 "humidity": humidity,
                 "battery": battery,
                 "timestamp": datetime.now().isoformat(),
-                "device_mac": DEVICE_MAC
+                "device_mac": device_mac
             }
         else:
             print("✗ 读取数据不完整，未保存到数据库")
             return None
 
-async def monitor_real_time(db: SensorDatabase):
-    """实时监控模式（订阅通知）并自动保存到数据库"""
-    print(f"启动实时监控 {DEVICE_MAC}...")
+class PollScheduler:
+    """
+    多设备轮询调度
+    每台设备独立排期，同时建立的蓝牙连接数不超过 max_connections（适配器通常只支持几个）；
+    读取失败按指数退避（带随机抖动）重试；读数变化快时缩短间隔，平稳后逐步恢复
+    """
+    
+    def __init__(self, writer: BatchWriter, devices: List[str] = DEVICES,
+                 max_connections: int = POLL_MAX_CONNECTIONS, interval: float = POLL_INTERVAL,
+                 min_interval: float = POLL_MIN_INTERVAL, max_backoff: float = POLL_MAX_BACKOFF,
+                 client_factory=BleakClient, reader=read_sensor_data):
+        self.writer = writer
+        self.devices = devices
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_backoff = max_backoff
+        self.client_factory = client_factory
+        self.reader = reader
+        self._semaphore = asyncio.Semaphore(max_connections)
+        # 每台设备的状态：当前间隔、连续失败次数、上一次读数
+        self.state = {mac: {"interval": interval, "failures": 0, "last": None} for mac in devices}
+    
+    def next_delay(self, mac: str, data: Optional[Dict]) -> float:
+        """根据本次结果计算到下次读取的等待时间"""
+        state = self.state[mac]
+        if data is None:
+            state["failures"] += 1
+            delay = min(self.max_backoff, state["interval"] * 2 ** (state["failures"] - 1))
+            return random.uniform(delay / 2, delay)
+        
+        state["failures"] = 0
+        last = state["last"]
+        state["last"] = data
+        if last is not None and (abs(data["temperature"] - last["temperature"]) >= POLL_CHANGE_TEMPERATURE
+                                 or abs(data["humidity"] - last["humidity"]) >= POLL_CHANGE_HUMIDITY):
+            state["interval"] = max(self.min_interval, state["interval"] / 2)
+        else:
+            state["interval"] = min(self.interval, state["interval"] * 1.5)
+        return state["interval"]
     
-    # 存储临时数据
-    temp_data = {'temperature': None, 'humidity': None, 'last_update': None}
+    async def poll(self, mac: str):
+        """读取一台设备，结果交给写入缓冲；返回读数，失败返回 None"""
+        async with self._semaphore:
+            try:
+                data = await asyncio.wait_for(self.reader(mac, self.client_factory), POLL_TIMEOUT)
+            except Exception as e:
+                print(f"✗ 读取 {mac} 失败: {e!r}")
+                data = None
+        if data is not None:
+            await self.writer.put(data)
+        return data
     
-    def temperature_handler(sender, data):
+    async def _device_loop(self, mac: str):
+        # 错开首次读取，避免所有设备同时抢连接
+        await asyncio.sleep(random.uniform(0, self.min_interval))
+        while True:
+            data = await self.poll(mac)
+            await asyncio.sleep(self.next_delay(mac, data))
+    
+    async def run(self, duration: Optional[float] = None):
+        """轮询所有设备，duration 为 None 时一直运行直到被取消"""
+        tasks = [asyncio.create_task(self._device_loop(mac)) for mac in self.devices]
+        try:
+            await asyncio.wait(tasks, timeout=duration)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+async def poll_devices(db: SensorDatabase, devices: List[str] = DEVICES, duration: Optional[float] = None):
+    """多设备轮询模式：按调度依次连接各设备读取并保存"""
+    print(f"启动多设备轮询，设备: {', '.join(devices)}")
+    async with BatchWriter(db) as writer:
+        try:
+            await PollScheduler(writer, devices).run(duration)
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            print("\n停止轮询...")
+    print(f"✓ 共保存 {writer.written} 条数据")
+
+class MonitorSupervisor:
+    """
+    实时监控的长连接管理
+    断开后按指数退避自动重连并重新订阅通知。首次解析到的设备对象会被缓存，
+    连接时只发现环境传感服务，重连无需重新扫描和完整发现服务。
+    连接状态（是否已连接、最后收包时间、重连次数）定期写入数据库，供网页服务查看
+    """
+    
+    def __init__(self, writer: BatchWriter, device_mac: str = DEVICE_MAC, client_factory=BleakClient,
+                 max_backoff: float = MONITOR_MAX_BACKOFF, health_interval: float = MONITOR_HEALTH_INTERVAL):
+        self.writer = writer
+        self.device_mac = device_mac
+        self.client_factory = client_factory
+        self.max_backoff = max_backoff
+        self.health_interval = health_interval
+        self.connected = False
+        self.reconnects = 0
+        self.last_packet = None  # 毫秒时间戳
+        self.last_error = None
+        self._device = None      # 缓存的 BLEDevice
+        self._disconnected = asyncio.Event()
+        # 存储临时数据
+        self._pending = {'temperature': None, 'humidity': None, 'last_update': None}
+    
+    def health(self) -> Dict:
+        return {
+            "device_mac": self.device_mac,
+            "connected": self.connected,
+            "last_packet": self.last_packet,
+            "reconnects": self.reconnects,
+            "last_error": self.last_error,
+        }
+    
+    async def _save_health(self):
+        await asyncio.to_thread(self.writer.db.save_health, self.health())
+    
+    def _on_notify(self, field: str, value: float):
+        self.last_packet = to_epoch_ms()
+        self._pending[field] = value
+        self._pending['last_update'] = datetime.now()
+        # 检查是否应该保存数据（当温度和湿度都更新时）
+        _check_and_save(self.writer, self._pending, self.device_mac)
+    
+    def temperature_handler(self, sender, data):
         """温度变化回调"""
         try:
             temp = parse_temperature(data)
-            temp_data['temperature'] = temp
-            temp_data['last_update'] = datetime.now()
             print(f"[{datetime.now().strftime('%H:%M:%S')}] 🌡️ 温度更新: {temp:.2f}°C")
-            
-            # 检查是否应该保存数据（当温度和湿度都更新时）
-            _check_and_save(db, temp_data)
+            self._on_notify('temperature', temp)
         except Exception as e:
             print(f"解析温度通知失败: {e}")
     
-    def humidity_handler(sender, data):
+    def humidity_handler(self, sender, data):
         """湿度变化回调"""
         try:
             hum = parse_humidity(data)
-            temp_data['humidity'] = hum
-            temp_data['last_update'] = datetime.now()
             print(f"[{datetime.now().strftime('%H:%M:%S')}] 💧 湿度更新: {hum:.2f}%")
-            
-            # 检查是否应该保存数据（当温度和湿度都更新时）
-            _check_and_save(db, temp_data)
+            self._on_notify('humidity', hum)
         except Exception as e:
             print(f"解析湿度通知失败: {e}")
     
-    async with BleakClient(DEVICE_MAC) as client:
-        # 启用温度通知
-        await client.start_notify(TEMPERATURE_CHAR, temperature_handler)
-        print("✓ 温度通知已启用")
-        
-        # 启用湿度通知
-        await client.start_notify(HUMIDITY_CHAR, humidity_handler)
-        print("✓ 湿度通知已启用")
-        
-        print("实时监控中... 按Ctrl+C停止")
-        print("-" * 40)
-        
+    def _on_disconnect(self, client):
+        self._disconnected.set()
+    
+    async def _resolve(self):
+        """解析设备地址，只在首次或设备丢失后扫描；找不到时退回使用地址字符串"""
+        if self._device is None and self.client_factory is BleakClient:
+            self._device = await BleakScanner.find_device_by_address(self.device_mac)
+        return self._device or self.device_mac
+    
+    async def _session(self):
+        """建立一次连接并订阅通知，直到连接断开"""
+        target = await self._resolve()
+        self._disconnected.clear()
+        async with self.client_factory(target, disconnected_callback=self._on_disconnect,
+                                       services=[ENVIRONMENTAL_SENSING_SERVICE]) as client:
+            # 启用温度通知
+            await client.start_notify(TEMPERATURE_CHAR, self.temperature_handler)
+            print("✓ 温度通知已启用")
+            
+            # 启用湿度通知
+            await client.start_notify(HUMIDITY_CHAR, self.humidity_handler)
+            print("✓ 湿度通知已启用")
+            
+            self.connected = True
+            self.last_error = None
+            await self._save_health()
+            await self._disconnected.wait()
+    
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            await self._save_health()
+    
+    async def run(self):
+        """保持连接直到被取消"""
+        health_task = asyncio.create_task(self._health_loop())
+        failures = 0
         try:
-            # 保持连接，等待通知
             while True:
-                await asyncio.sleep(1)
-        except KeyboardInterrupt:
+                started = time.monotonic()
+                try:
+                    await self._session()
+                    print(f"✗ 设备 {self.device_mac} 连接断开")
+                except Exception as e:
+                    self.last_error = repr(e)
+                    UPSTREAM_ERRORS.inc("ble", "connect")
+                    print(f"✗ 连接 {self.device_mac} 失败: {e!r}")
+                    self._device = None  # 可能是设备对象已失效，下次重新扫描
+                self.connected = False
+                self.reconnects += 1
+                await self._save_health()
+                
+                # 连接保持了一段时间才断开，说明不是持续性故障，从头开始退避
+                if time.monotonic() - started > self.max_backoff:
+                    failures = 0
+                delay = random.uniform(0, min(self.max_backoff, 2 ** failures))
+                failures += 1
+                print(f"{delay:.1f} 秒后重连...")
+                await asyncio.sleep(delay)
+        finally:
+            health_task.cancel()
+            self.connected = False
+            await asyncio.shield(self._save_health())
+
+async def monitor_real_time(db: SensorDatabase):
+    """实时监控模式（订阅通知，断线自动重连），读数经写入缓冲批量保存到数据库"""
+    print(f"启动实时监控 {DEVICE_MAC}...")
+    print("实时监控中... 按Ctrl+C停止")
+    print("-" * 40)
+    
+    async with BatchWriter(db) as writer:
+        try:
+            await MonitorSupervisor(writer).run()
+        except (KeyboardInterrupt, asyncio.CancelledError):
             print("\n停止监控...")
-            await client.stop_notify(TEMPERATURE_CHAR)
-            await client.stop_notify(HUMIDITY_CHAR)
+    print(f"✓ 共保存 {writer.written} 条数据")
 
-def _check_and_save(db: SensorDatabase, temp_data: dict):
-    """检查并保存数据（当温度和湿度都有效时）"""
+def _check_and_save(writer: BatchWriter, temp_data: dict, device_mac: str = DEVICE_MAC):
+    """检查并保存数据（当温度和湿度都有效时），只入队不等待写盘"""
     if temp_data['temperature'] is not None and temp_data['humidity'] is not None:
-        # 保存到数据库
-        db.save_reading({
+        # 放入写入缓冲
+        writer.submit({
             "temperature": temp_data['temperature'],
             "humidity": temp_data['humidity'],
-            "timestamp": datetime.now().isoformat(),
-            "device_mac": DEVICE_MAC
+            "ts": to_epoch_ms(),
+            "device_mac": device_mac
         })
         # 重置临时数据
         temp_data['temperature'] = None
@@ -376,7 +1050,7 @@ async def discover_services():
 def display_recent_data(db: SensorDatabase):
     """显示最近的3组数据"""
     print("\n" + "="*60)
-    print(f"最近{db.max_records}组传感器数据:")
+    print(f"最近3组传感器数据:")
     print("="*60)
     
     recent_data = db.get_recent_readings()
@@ -400,8 +1074,15 @@ def main():
     """主菜单"""
     import sys
     
-    # 初始化数据库（只保存3条记录）
-    db = SensorDatabase(max_records=3)
+    # 初始化数据库
+    db = SensorDatabase()
+    
+    # 采集进程单独提供 /metrics（蓝牙读取与写入的耗时、失败、丢弃条数）
+    if SENSOR_METRICS_PORT:
+        try:
+            metrics.serve(SENSOR_METRICS_PORT, SENSOR_METRICS_HOST)
+        except OSError as e:
+            print(f"启动指标服务失败: {e}")
     
     while True:
         print("\n" + "=" * 50)
@@ -409,13 +1090,15 @@ def main():
         print("=" * 50)
         print("1. 单次读取温湿度并保存")
         print("2. 实时监控模式（自动保存）")
-        print("3. 发现所有服务（调试）")
-        print("4. 查看最近数据")
-        print("5. 清空所有数据")
-        print("6. 退出")
+        print("3. 广播扫描模式（多设备，无需连接）")
+        print("4. 多设备轮询模式（自动保存）")
+        print("5. 发现所有服务（调试）")
+        print("6. 查看最近数据")
+        print("7. 清空所有数据")
+        print("8. 退出")
         print("-" * 50)
         
-        choice = input("请选择 (1-6): ").strip()
+        choice = input("请选择 (1-8): ").strip()
         
         try:
             if choice == "1":
@@ -436,18 +1119,26 @@ def main():
                 asyncio.run(monitor_real_time(db))
                 
             elif choice == "3":
+                # 广播扫描
+                asyncio.run(scan_advertisements(db))
+                
+            elif choice == "4":
+                # 多设备轮询
+                asyncio.run(poll_devices(db))
+                
+            elif choice == "5":
                 # 发现服务
                 asyncio.run(discover_services())
                 
-            elif choice == "4":
+            elif choice == "6":
                 # 查看最近数据
                 display_recent_data(db)
                 
-            elif choice == "5":
+            elif choice == "7":
                 # 清空所有数据
                 db.clear_all_data()
                 
-            elif choice == "6":
+            elif choice == "8":
                 print("再见！")
                 sys.exit(0)
                 
@@ -462,7 +1153,7 @@ def main():
 # 简化版本：直接读取并保存，适合自动化脚本
 async def quick_read_and_save():
     """快速读取并保存数据，适合自动化任务"""
-    db = SensorDatabase(max_records=3)
+    db = SensorDatabase()
     data = await read_sensor_data()
     
     if data:
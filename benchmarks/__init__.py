@@ -0,0 +1,11 @@
+"""
+bench_import.py     # 历史数据批量导入性能对比（python -m benchmarks.bench_import）
+bench_normalize.py  # 彩云天气实时数据整理单次开销对比（python -m benchmarks.bench_normalize）
+bench_presence.py   # 有人检测单帧开销对比（python -m benchmarks.bench_presence）
+bench_sensors.py    # 温湿度写入/读取与蓝牙采集链路性能（python -m benchmarks.bench_sensors）
+bench_sqlite.py     # 温湿度数据库读取性能对比（python -m benchmarks.bench_sqlite）
+bench_weather.py    # /weather 全链路压测与 process_weather_data 开销（python -m benchmarks.bench_weather）
+fakes.py            # 彩云天气/AI/蓝牙温湿度计的本地替身
+run.py              # 运行全部测试并输出 JSON，可与上次结果对比（python -m benchmarks.run）
+data/               # 替身回放用的录制数据
+"""
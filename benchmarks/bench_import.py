@@ -0,0 +1,95 @@
+"""
+历史数据批量导入性能对比
+
+python -m benchmarks.bench_import [--records 200000]
+
+before: 逐条 struct.unpack 解码 + 每条一个事务写入（save_reading 的写法）
+after:  np.frombuffer 结构化 dtype 整块解码 + 每块一个事务 executemany
+解码与写入分别计时；before 的写入只测前 --slow-records 条，按比例换算
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import struct
+import tempfile
+import time
+
+import numpy as np
+
+from LYWSD03MMC_db import SensorDatabase, RECORD_DTYPES, decode_records
+from services.get_db import close_connections
+from services.config import IMPORT_CHUNK_SIZE
+
+_PVVX_RECORD = struct.Struct('<q6shHHBBB')
+
+
+def make_buffer(n):
+    """生成 n 条 pvvx-adv 格式的记录（4 台设备，每 10 秒一条）"""
+    records = np.zeros(n, dtype=RECORD_DTYPES["pvvx-adv"])
+    now = int(time.time() * 1000)
+    records["ts"] = now - (n - np.arange(n)) * 10000
+    records["mac"] = np.array([[i, 0, 0, 0x38, 0xC1, 0xA4] for i in range(4)], dtype=np.uint8)[np.arange(n) % 4]
+    records["temperature"] = 2000 + np.arange(n) % 500
+    records["humidity"] = 5000 + np.arange(n) % 1000
+    records["voltage"] = 2950
+    records["battery"] = 90
+    return records.tobytes()
+
+def decode_before(buffer):
+    readings = []
+    for ts, mac, temp, hum, _, battery, _, _ in _PVVX_RECORD.iter_unpack(buffer):
+        readings.append({"ts": ts, "device_mac": mac[::-1].hex(":").upper(),
+                         "temperature": temp / 100.0, "humidity": hum / 100.0, "battery": battery})
+    return readings
+
+def run(n=200000, slow_records=2000):
+    buffer = make_buffer(n)
+    results = {"records": n}
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        readings = decode_before(buffer)
+        decode_seconds = time.perf_counter() - started
+        db = SensorDatabase(os.path.join(tmp, "before.db"))
+        db.compact = lambda since=None: None  # 只测写入
+        started = time.perf_counter()
+        for reading in readings[:slow_records]:
+            db.save_reading(reading)
+        write_seconds = (time.perf_counter() - started) * n / slow_records
+        results["before"] = {"decode_per_sec": round(n / decode_seconds),
+                             "write_per_sec": round(n / write_seconds)}
+
+        itemsize = RECORD_DTYPES["pvvx-adv"].itemsize
+        chunk_bytes = itemsize * IMPORT_CHUNK_SIZE
+        started = time.perf_counter()
+        chunks = [decode_records(buffer[i:i + chunk_bytes], "pvvx-adv") for i in range(0, len(buffer), chunk_bytes)]
+        decode_seconds = time.perf_counter() - started
+        db = SensorDatabase(os.path.join(tmp, "after.db"))
+        started = time.perf_counter()
+        for records in chunks:
+            db.import_records(records)
+        write_seconds = time.perf_counter() - started
+        results["after"] = {"decode_per_sec": round(n / decode_seconds),
+                            "write_per_sec": round(n / write_seconds)}
+        close_connections()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="历史数据批量导入性能对比")
+    parser.add_argument("--records", type=int, default=200000, help="记录条数")
+    parser.add_argument("--slow-records", type=int, default=2000, help="逐条写入实际测试的条数")
+    args = parser.parse_args()
+
+    results = run(args.records, args.slow_records)
+    for name in ("before", "after"):
+        r = results[name]
+        print(f"{name:>6}: 解码 {r['decode_per_sec']:>10} 条/秒   写入 {r['write_per_sec']:>8} 条/秒")
+    for key in ("decode_per_sec", "write_per_sec"):
+        speedup = results["after"][key] / max(results["before"][key], 1)
+        print(f"{key}: {speedup:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
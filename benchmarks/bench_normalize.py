@@ -0,0 +1,135 @@
+"""
+彩云天气实时数据整理（process_weather_data）单次开销对比
+
+python -m benchmarks.bench_normalize [--calls 50000] [--payload data/caiyun_realtime.json]
+
+before: 每次调用重建 skycon 字典、同一字段多次 get、所有数值格式化为字符串，
+        快照再用 float(w['气温']) 解析回来；降水强度用 if/elif 链分级
+after:  WeatherSnapshot（dataclass slots）保存数值，查找表在模块级，降水强度用 bisect 分级，
+        描述文字与更新时间只在用到时生成
+process 只测整理本身；snapshot 另外包含 build_snapshot 读取所需字段的部分
+"""
+
+import argparse
+import json
+import time
+from datetime import datetime
+
+from benchmarks.fakes import CAIYUN_PAYLOAD
+from services.cai_yun import process_weather_data, convert_intensity_to_description
+
+
+def convert_before(intensity):
+    if intensity < 0.031:
+        return "无雨/雪"
+    elif 0.031 <= intensity < 0.25:
+        return "小雨/雪"
+    elif 0.25 <= intensity < 0.35:
+        return "中雨/雪"
+    elif 0.35 <= intensity < 0.48:
+        return "大雨/雪"
+    else:
+        return "暴雨/雪"
+
+def process_before(data):
+    """改造前的 process_weather_data（去掉打印）"""
+    if not data or data.get('status') != 'ok':
+        return None
+    realtime = data.get('result', {}).get('realtime', {})
+    if not realtime:
+        return None
+    update_time = datetime.fromtimestamp(data.get('server_time', 0)).strftime('%Y-%m-%d %H:%M:%S')
+    temperature = realtime.get('temperature', 'N/A')
+    humidity_raw = realtime.get('humidity', 0)
+    humidity_percent = round(humidity_raw * 100, 1) if humidity_raw != 'N/A' else 'N/A'
+    local_intensity_raw = realtime.get('precipitation', {}).get('local', {}).get('intensity', 'N/A')
+    local_intensity_desc = convert_before(local_intensity_raw) if local_intensity_raw != 'N/A' else 'N/A'
+    nearest_precipitation = realtime.get('precipitation', {}).get('nearest', {})
+    nearest_distance = nearest_precipitation.get('distance', 'N/A')
+    nearest_intensity_raw = nearest_precipitation.get('intensity', 'N/A')
+    nearest_intensity_desc = convert_before(nearest_intensity_raw) if nearest_intensity_raw != 'N/A' else 'N/A'
+    skycon_map = {
+        "PARTLY_CLOUDY_DAY": "多云（白天）", "PARTLY_CLOUDY_NIGHT": "多云（夜晚）", "CLEAR_DAY": "晴（白天）",
+        "CLEAR_NIGHT": "晴（夜晚）", "CLOUDY": "阴", "LIGHT_RAIN": "小雨", "MODERATE_RAIN": "中雨",
+        "HEAVY_RAIN": "大雨", "STORM_RAIN": "暴雨", "LIGHT_SNOW": "小雪", "MODERATE_SNOW": "中雪",
+        "HEAVY_SNOW": "大雪", "STORM_SNOW": "暴雪"
+    }
+    skycon = realtime.get('skycon', 'N/A')
+    skycon_desc = skycon_map.get(skycon, skycon)
+    wind = realtime.get('wind', {})
+    wind_speed = wind.get('speed', 'N/A')
+    wind_direction = wind.get('direction', 'N/A')
+    air_quality = realtime.get('air_quality', {})
+    aqi = air_quality.get('aqi', {}).get('chn', 'N/A')
+    return {
+        '更新时间': update_time,
+        '气温': f"{temperature}" if temperature != 'N/A' else 'N/A',
+        '体感温度': f"{realtime.get('apparent_temperature', 'N/A')}" if realtime.get('apparent_temperature') != 'N/A' else 'N/A',
+        '湿度': f"{humidity_percent}" if humidity_percent != 'N/A' else 'N/A',
+        '天气状况': skycon_desc,
+        '本地降水强度': local_intensity_desc,
+        '本地降水强度值': local_intensity_raw,
+        '最近降水距离': f"{nearest_distance}" if nearest_distance != 'N/A' else 'N/A',
+        '最近降水强度': nearest_intensity_desc,
+        '最近降水强度值': nearest_intensity_raw,
+        '风速': f"{wind_speed}" if wind_speed != 'N/A' else 'N/A',
+        '风向': f"{wind_direction}" if wind_direction != 'N/A' else 'N/A',
+        '气压': f"{realtime.get('pressure', 'N/A')/100:.1f}" if realtime.get('pressure') != 'N/A' else 'N/A',
+        '能见度': f"{realtime.get('visibility', 'N/A')}" if realtime.get('visibility') != 'N/A' else 'N/A',
+        '空气质量指数(AQI)': aqi,
+        'PM2.5': f"{air_quality.get('pm25', 'N/A')}" if air_quality.get('pm25') != 'N/A' else 'N/A'
+    }
+
+def snapshot_before(data):
+    w = process_before(data)
+    return (round(float(w['气温']), 1), w['本地降水强度'], w['最近降水距离'], w['最近降水强度'], w['更新时间'])
+
+def snapshot_after(data):
+    w = process_weather_data(data)
+    return (round(w.temperature, 1), w.local_intensity_desc, w.nearest_distance, w.nearest_intensity_desc,
+            w.update_time)
+
+def _us_per_call(func, arg, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        func(arg)
+    return round((time.perf_counter() - start) / calls * 1e6, 3)
+
+def run(calls=50000, payload=CAIYUN_PAYLOAD):
+    with open(payload, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    # 两种写法的结果应一致
+    assert process_weather_data(data).to_dict() == process_before(data)
+    intensities = [i / 100 for i in range(60)]
+    assert [convert_before(x) for x in intensities] == [convert_intensity_to_description(x) for x in intensities]
+
+    results = {"calls": calls}
+    for name, process, snapshot, convert in (
+            ("before", process_before, snapshot_before, convert_before),
+            ("after", process_weather_data, snapshot_after, convert_intensity_to_description)):
+        results[name] = {
+            "process_us": _us_per_call(process, data, calls),
+            "snapshot_us": _us_per_call(snapshot, data, calls),
+            # 0.6 落在最后一档，if/elif 链需要比较最多次
+            "intensity_us": _us_per_call(convert, 0.6, calls * 10),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="彩云天气实时数据整理单次开销对比")
+    parser.add_argument("--calls", type=int, default=50000, help="每项调用次数")
+    parser.add_argument("--payload", default=CAIYUN_PAYLOAD, help="录制的 realtime JSON")
+    args = parser.parse_args()
+
+    results = run(args.calls, args.payload)
+    for name in ("before", "after"):
+        r = results[name]
+        print(f"{name:>6}: 整理 {r['process_us']:>7} µs/次   含快照字段 {r['snapshot_us']:>7} µs/次   "
+              f"强度分级 {r['intensity_us']:>6} µs/次")
+    for key in ("process_us", "snapshot_us", "intensity_us"):
+        print(f"{key}: {results['before'][key] / max(results['after'][key], 1e-9):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
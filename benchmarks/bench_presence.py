@@ -0,0 +1,114 @@
+"""
+有人检测单帧开销
+
+python -m benchmarks.bench_presence [--video a.mp4 b.mp4 ...] [--frames 300]
+
+before: 全分辨率灰度 + 模糊 + 帧差（不缩小）
+after:  MotionDetector，隔行隔列抽样到 PRESENCE_WIDTH 宽后再检测
+不指定视频时生成一段 1280x720 的合成视频：前半段有物体移动，后半段静止
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from services.presence import MotionDetector
+from services.config import PRESENCE_MIN_RATIO, PRESENCE_BUDGET_MS, PRESENCE_PIXEL_DELTA
+
+
+class FullResolutionDetector:
+    """改造前的写法：在整帧上做同样的检测"""
+
+    def __init__(self):
+        self._background = None
+
+    def motion(self, frame):
+        gray = cv2.GaussianBlur(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (3, 3), 0)
+        if self._background is None:
+            self._background = gray.astype(np.float32)
+            return 0.0
+        diff = cv2.absdiff(gray, cv2.convertScaleAbs(self._background))
+        ratio = np.count_nonzero(diff > PRESENCE_PIXEL_DELTA) / diff.size
+        cv2.accumulateWeighted(gray, self._background, 0.05)
+        return ratio
+
+
+def make_video(path, frames=300, size=(1280, 720)):
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 10, size)
+    rng = np.random.default_rng(0)
+    background = rng.integers(60, 120, (size[1], size[0], 3), dtype=np.uint8)
+    for i in range(frames):
+        frame = background.copy()
+        x = (i * 15) % (size[0] - 200) if i < frames // 2 else 300
+        cv2.rectangle(frame, (x, 200), (x + 200, 600), (200, 180, 160), -1)
+        writer.write(frame)
+    writer.release()
+
+def load_frames(path, limit):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < limit:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+def measure(detector, frames):
+    costs, motion = [], []
+    for frame in frames:
+        start = time.thread_time()
+        ratio = detector.motion(frame)
+        costs.append((time.thread_time() - start) * 1000)
+        motion.append(ratio >= PRESENCE_MIN_RATIO)
+    costs = np.array(costs[1:]) if len(costs) > 1 else np.array(costs)
+    return {
+        "ms_mean": round(float(costs.mean()), 3),
+        "ms_p99": round(float(np.percentile(costs, 99)), 3),
+        "over_budget": int((costs > PRESENCE_BUDGET_MS).sum()),
+        "motion_frames": int(sum(motion)),
+    }
+
+def run(videos=None, frames=300):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        if not videos:
+            path = os.path.join(tmp, "synthetic.avi")
+            make_video(path, frames)
+            videos = [path]
+        for video in videos:
+            clip = load_frames(video, frames)
+            if not clip:
+                print(f"无法读取视频: {video}")
+                continue
+            results[os.path.basename(video)] = {
+                "frames": len(clip),
+                "resolution": f"{clip[0].shape[1]}x{clip[0].shape[0]}",
+                "before": measure(FullResolutionDetector(), clip),
+                "after": measure(MotionDetector(), clip),
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="有人检测单帧开销")
+    parser.add_argument("--video", nargs="*", help="录制的视频文件，不指定时使用合成视频")
+    parser.add_argument("--frames", type=int, default=300, help="每个视频最多使用的帧数")
+    args = parser.parse_args()
+
+    for name, r in run(args.video, args.frames).items():
+        print(f"{name}（{r['resolution']}，{r['frames']} 帧）")
+        for key in ("before", "after"):
+            m = r[key]
+            print(f"  {key:>6}: 平均 {m['ms_mean']:.3f} ms  p99 {m['ms_p99']:.3f} ms  "
+                  f"超出预算 {m['over_budget']} 帧  有运动 {m['motion_frames']} 帧")
+        print(f"  提升: {r['before']['ms_mean'] / max(r['after']['ms_mean'], 1e-6):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+温湿度写入/读取与蓝牙采集链路性能（蓝牙使用 FakeBleakClient 替身）
+
+python -m benchmarks.bench_sensors [--rows 1000000] [--calls 2000] [--seconds 3] [--devices 8]
+
+save_reading:        已有 rows 条数据时逐条保存的延迟（每条一个事务）
+get_recent_readings: 已有 rows 条数据时读取最新 1 条 / 最近 100 条的延迟
+ble_poll:            PollScheduler 轮询 devices 台替身设备，经 BatchWriter 写入的吞吐量
+"""
+
+import argparse
+import asyncio
+import contextlib
+import functools
+import io
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.fakes import FakeBleakClient
+from LYWSD03MMC_db import SensorDatabase, BatchWriter, PollScheduler
+from services.get_db import get_recent_readings, close_connections
+
+DEVICES = [f"A4:C1:38:00:00:{i:02X}" for i in range(256)]
+
+
+def _latency(func, calls):
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+    latencies = np.array(latencies) * 1000
+    return {
+        "calls": calls,
+        "per_sec": round(calls / (latencies.sum() / 1000)),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+    }
+
+def seed(db, rows, devices=4, chunk=100000):
+    """写入 rows 条历史数据（每台设备每 10 秒一条，截止到现在）"""
+    now = int(time.time() * 1000)
+    for offset in range(0, rows, chunk):
+        db.save_readings([
+            {"ts": now - (rows - i) * 10000 // devices, "device_mac": DEVICES[i % devices],
+             "temperature": 20 + i % 50 / 10, "humidity": 50 + i % 100 / 10, "battery": 90}
+            for i in range(offset, min(offset + chunk, rows))
+        ])
+
+async def bench_poll(db, devices, seconds, connect_latency):
+    factory = functools.partial(FakeBleakClient, connect_latency=connect_latency, read_latency=0.005)
+    async with BatchWriter(db) as writer:
+        scheduler = PollScheduler(writer, DEVICES[:devices], interval=0.05, min_interval=0.01,
+                                  client_factory=factory)
+        await scheduler.run(seconds)
+    return {"devices": devices, "reads_per_sec": round(writer.written / seconds, 1),
+            "written": writer.written, "dropped": writer.dropped, "failed": writer.failed}
+
+def run(rows=1000000, calls=2000, seconds=3.0, devices=8, connect_latency=0.05):
+    results = {"rows": rows}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+        # get_recent_readings 使用默认的相对路径，在临时目录中运行
+        os.chdir(tmp)
+        try:
+            db = SensorDatabase()
+            db.compact = lambda since=None: None  # 汇总单独测试，这里只测写入本身
+            started = time.perf_counter()
+            seed(db, rows)
+            results["seed_rows_per_sec"] = round(rows / (time.perf_counter() - started))
+
+            reading = {"temperature": 21.0, "humidity": 45.0, "battery": 90, "device_mac": DEVICES[0]}
+            results["save_reading"] = _latency(lambda: db.save_reading(dict(reading, ts=int(time.time() * 1000))), calls)
+            results["get_recent_readings"] = {
+                "latest": _latency(lambda: get_recent_readings(1), calls),
+                "recent_100": _latency(lambda: get_recent_readings(100), calls),
+                "latest_by_device": _latency(lambda: get_recent_readings(1, DEVICES[1]), calls),
+            }
+            results["ble_poll"] = asyncio.run(bench_poll(db, devices, seconds, connect_latency))
+        finally:
+            close_connections()
+            os.chdir(cwd)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="温湿度写入/读取与蓝牙采集链路性能")
+    parser.add_argument("--rows", type=int, default=1000000, help="预先写入的记录数")
+    parser.add_argument("--calls", type=int, default=2000, help="每项延迟测试的调用次数")
+    parser.add_argument("--seconds", type=float, default=3.0, help="蓝牙轮询测试时长")
+    parser.add_argument("--devices", type=int, default=8, help="替身设备数")
+    parser.add_argument("--connect-latency", type=float, default=0.05, help="替身设备的连接延迟（秒）")
+    args = parser.parse_args()
+
+    results = run(args.rows, args.calls, args.seconds, args.devices, args.connect_latency)
+    print(f"{results['rows']} 条数据（写入 {results['seed_rows_per_sec']} 条/秒）")
+    rows = [("save_reading", results["save_reading"])]
+    rows += [(f"get_recent_readings {k}", v) for k, v in results["get_recent_readings"].items()]
+    for name, r in rows:
+        print(f"{name:>36}: {r['per_sec']:>8} 次/秒  p50 {r['p50_ms']} ms  p99 {r['p99_ms']} ms")
+    r = results["ble_poll"]
+    print(f"蓝牙轮询 {r['devices']} 台: {r['reads_per_sec']} 条/秒  丢弃 {r['dropped']}  失败 {r['failed']}")
+
+
+if __name__ == "__main__":
+    main()
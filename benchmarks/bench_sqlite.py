@@ -0,0 +1,155 @@
+"""
+温湿度数据库读取性能对比
+
+python -m benchmarks.bench_sqlite [--seconds 3] [--rows 100000]
+
+before: 改造前的数据库与写法：timestamp 文本列 + 回滚日志（journal_mode=DELETE），
+        每次查询新建连接 + SELECT * + sqlite3.Row 逐行转字典；写入方同样使用改造前的表结构
+after:  线程内复用连接（WAL + busy_timeout）+ 固定查询语句 + 字典行工厂，按时间倒序取最近一条
+latest: 同上，但直接读每台设备一行的 sensor_latest 表
+每种写法分别测试 单独读取 与 后台线程持续写入时读取 两种场景（before 使用单独的改造前数据库）
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from LYWSD03MMC_db import SensorDatabase, INSERT_READING, UPSERT_LATEST
+from services.get_db import get_connection, close_connections, SELECT_RECENT, SELECT_LATEST
+
+DEVICE = "A4:C1:38:00:00:00"
+
+# 改造前的表结构（默认回滚日志模式）
+BASELINE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS sensor_readings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    device_mac TEXT NOT NULL,
+    temperature REAL,
+    humidity REAL,
+    battery INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_timestamp ON sensor_readings(timestamp);
+'''
+BASELINE_INSERT = '''
+INSERT INTO sensor_readings 
+(timestamp, device_mac, temperature, humidity, battery)
+VALUES (?, ?, ?, ?, ?)
+'''
+
+
+def read_before(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    cursor.execute('''
+    SELECT * FROM sensor_readings 
+    ORDER BY timestamp DESC 
+    LIMIT ?
+    ''', (1,))
+    rows = cursor.fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+def read_after(db_path):
+    return get_connection(db_path).execute(SELECT_RECENT, (1,)).fetchall()
+
+def read_latest(db_path):
+    return get_connection(db_path).execute(SELECT_LATEST).fetchall()
+
+def create_database(db_path, rows):
+    SensorDatabase(db_path)
+    conn = get_connection(db_path)
+    now = int(time.time() * 1000)
+    with conn:
+        conn.executemany(INSERT_READING, [(now - (rows - i) * 1000, DEVICE, 20.0, 50.0, 90) for i in range(rows)])
+        conn.execute(UPSERT_LATEST, (DEVICE, now, 20.0, 50.0, 90))
+
+def create_baseline_database(db_path, rows):
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=DELETE")
+    conn.executescript(BASELINE_SCHEMA)
+    now = datetime.now()
+    with conn:
+        conn.executemany(BASELINE_INSERT, [((now - timedelta(seconds=rows - i)).isoformat(), DEVICE, 20.0, 50.0, 90)
+                                           for i in range(rows)])
+    conn.close()
+
+def baseline_writer(db_path, stop):
+    """改造前的蓝牙采集写入：ISO 时间文本，回滚日志模式下每条提交一次"""
+    conn = sqlite3.connect(db_path, timeout=5)
+    while not stop.is_set():
+        with conn:
+            conn.execute(BASELINE_INSERT, (datetime.now().isoformat(), DEVICE, 21.0, 51.0, 90))
+        time.sleep(0.001)
+    conn.close()
+
+def writer(db_path, stop):
+    """模拟蓝牙采集进程：持续写入"""
+    conn = sqlite3.connect(db_path, timeout=5)
+    while not stop.is_set():
+        ts = int(time.time() * 1000)
+        with conn:
+            conn.execute(INSERT_READING, (ts, DEVICE, 21.0, 51.0, 90))
+            conn.execute(UPSERT_LATEST, (DEVICE, ts, 21.0, 51.0, 90))
+        time.sleep(0.001)
+    conn.close()
+
+def measure(func, db_path, seconds):
+    """返回 (每秒读取次数, 失败次数)"""
+    count = errors = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        try:
+            func(db_path)
+            count += 1
+        except sqlite3.OperationalError:
+            errors += 1
+    return count / seconds, errors
+
+def run(seconds=3.0, rows=100000):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        baseline_path = os.path.join(tmp, "baseline.db")
+        create_baseline_database(baseline_path, rows)
+        db_path = os.path.join(tmp, "bench.db")
+        create_database(db_path, rows)
+        for name, func, path, write in (("before", read_before, baseline_path, baseline_writer),
+                                        ("after", read_after, db_path, writer),
+                                        ("latest", read_latest, db_path, writer)):
+            reads, _ = measure(func, path, seconds)
+            stop = threading.Event()
+            t = threading.Thread(target=write, args=(path, stop))
+            t.start()
+            try:
+                contended, errors = measure(func, path, seconds)
+            finally:
+                stop.set()
+                t.join()
+            results[name] = {"reads_per_sec": round(reads), "reads_per_sec_with_writer": round(contended),
+                             "errors_with_writer": errors}
+        close_connections()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="温湿度数据库读取性能对比")
+    parser.add_argument("--seconds", type=float, default=3.0, help="每个场景的测试时长")
+    parser.add_argument("--rows", type=int, default=100000, help="预先写入的记录数")
+    args = parser.parse_args()
+
+    results = run(args.seconds, args.rows)
+    for name, r in results.items():
+        print(f"{name:>6}: {r['reads_per_sec']:>8} 次/秒   有写入时 {r['reads_per_sec_with_writer']:>8} 次/秒"
+              f"   失败 {r['errors_with_writer']}")
+    for name in ("after", "latest"):
+        speedup = results[name]["reads_per_sec"] / max(results["before"]["reads_per_sec"], 1)
+        print(f"{name} 相对 before 提升: {speedup:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+/weather 全链路性能（彩云天气与AI使用本地替身）
+
+python -m benchmarks.bench_weather [--seconds 5] [--concurrency 20] [--caiyun-latency 0.2] [--llm-latency 0.5]
+
+process: process_weather_data 单次调用耗时（录制的 realtime 数据）
+refresh: 冷启动时 SnapshotRefresher.refresh() 的耗时（彩云请求 + 数据库 + 建议生成）
+weather: 以 concurrency 个并发连接持续请求 /weather 的吞吐量与 p50/p99 延迟；
+         conditional 场景带 If-None-Match，测试 304 路径
+服务与压测客户端在同一进程中运行（服务在独立线程），绝对数值偏保守，适合前后对比
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+
+import httpx
+import numpy as np
+import uvicorn
+from openai import AsyncOpenAI
+
+from benchmarks.fakes import FakeCaiyunServer, FakeLLMServer, CAIYUN_PAYLOAD
+from LYWSD03MMC_db import SensorDatabase
+from services import cai_yun, clothes_suggest
+from services.get_db import close_connections
+from services.snapshot import SnapshotRefresher
+
+
+def bench_process(payload, calls=20000):
+    """process_weather_data 每次调用的微秒数"""
+    with open(payload, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    start = time.perf_counter()
+    for _ in range(calls):
+        cai_yun.process_weather_data(data)
+    return {"calls": calls, "us_per_call": round((time.perf_counter() - start) / calls * 1e6, 2)}
+
+def use_fakes(caiyun, llm):
+    """让彩云天气与AI客户端指向替身，并关闭落盘缓存与预计算查找表"""
+    cai_yun.client = cai_yun.CaiyunClient(base_url=caiyun.url, token="bench", retries=0)
+    cai_yun._cache = cai_yun.ResponseCache(path=None)
+    clothes_suggest._cache = clothes_suggest.AdviceCache(path=None)
+    clothes_suggest._table = None
+    clothes_suggest._client = AsyncOpenAI(api_key="bench", base_url=llm.url)
+
+async def bench_refresh():
+    refresher = SnapshotRefresher()
+    start = time.perf_counter()
+    await refresher.refresh()
+    seconds = time.perf_counter() - start
+    snapshot = refresher.snapshots.get("default") or {}
+    await cai_yun.client.aclose()
+    return {"seconds": round(seconds, 3), "timings_ms": snapshot.get("timings"),
+            "error": refresher.errors.get("default")}
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _summary(latencies, seconds):
+    latencies = np.array(latencies) * 1000
+    return {
+        "requests": len(latencies),
+        "requests_per_sec": round(len(latencies) / seconds),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 2),
+    }
+
+async def load_test(url, seconds, concurrency, conditional=False):
+    """concurrency 个连接各自循环请求 url，返回吞吐量与延迟分位数"""
+    latencies = []
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        headers = {}
+        if conditional:
+            headers["If-None-Match"] = (await client.get(url)).headers.get("etag", "")
+        deadline = time.perf_counter() + seconds
+
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(url, headers=headers)
+                    if response.status_code not in (200, 304):
+                        errors += 1
+                        continue
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result = _summary(latencies, seconds) if latencies else {"requests": 0}
+    result["errors"] = errors
+    return result
+
+def bench_http(seconds, concurrency):
+    import main
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    try:
+        while not server.started:
+            time.sleep(0.05)
+        url = f"http://127.0.0.1:{port}/weather"
+        return {
+            "plain": asyncio.run(load_test(url, seconds, concurrency)),
+            "conditional": asyncio.run(load_test(url, seconds, concurrency, conditional=True)),
+        }
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+def run(seconds=5.0, concurrency=20, caiyun_latency=0.2, llm_latency=0.5, payload=CAIYUN_PAYLOAD):
+    results = {"process": bench_process(payload)}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp, \
+            FakeCaiyunServer(caiyun_latency, payload) as caiyun, FakeLLMServer(llm_latency, 0.01) as llm:
+        # 数据库使用默认的相对路径，在临时目录中运行
+        os.chdir(tmp)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                SensorDatabase().save_reading({"temperature": 22.3, "humidity": 48.0, "battery": 90})
+            use_fakes(caiyun, llm)
+            results["refresh"] = asyncio.run(bench_refresh())
+            use_fakes(caiyun, llm)
+            results["weather"] = bench_http(seconds, concurrency)
+            results["upstream_requests"] = {"caiyun": caiyun.requests, "llm": llm.requests}
+        finally:
+            close_connections()
+            os.chdir(cwd)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/weather 全链路性能")
+    parser.add_argument("--seconds", type=float, default=5.0, help="每个压测场景的时长")
+    parser.add_argument("--concurrency", type=int, default=20, help="并发连接数")
+    parser.add_argument("--caiyun-latency", type=float, default=0.2, help="彩云天气替身的响应延迟（秒）")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="AI替身的首字延迟（秒）")
+    parser.add_argument("--payload", default=CAIYUN_PAYLOAD, help="录制的 realtime JSON")
+    args = parser.parse_args()
+
+    results = run(args.seconds, args.concurrency, args.caiyun_latency, args.llm_latency, args.payload)
+    print(f"process_weather_data: {results['process']['us_per_call']} µs/次")
+    r = results["refresh"]
+    print(f"冷启动刷新: {r['seconds']} 秒  各阶段(ms): {r['timings_ms']}  错误: {r['error']}")
+    for name, r in results["weather"].items():
+        print(f"/weather {name:>11}: {r.get('requests_per_sec', 0):>6} 次/秒  "
+              f"p50 {r.get('p50_ms')} ms  p99 {r.get('p99_ms')} ms  失败 {r['errors']}")
+    print(f"上游请求次数: {results['upstream_requests']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+性能测试用的本地替身，不需要网络和蓝牙硬件
+
+FakeCaiyunServer: 回放录制的彩云天气 JSON，可设置响应延迟
+FakeLLMServer:    OpenAI 兼容的 /chat/completions，支持流式，可设置首字延迟与逐字间隔
+FakeBleakClient:  按 BleakClient 的用法返回温湿度特征值，可设置连接/读取延迟
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from LYWSD03MMC_db import TEMPERATURE_CHAR, HUMIDITY_CHAR, BATTERY_CHAR
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+CAIYUN_PAYLOAD = os.path.join(DATA_DIR, "caiyun_realtime.json")
+
+
+class _Server:
+    """在后台线程运行的 HTTP 服务，可用作上下文管理器"""
+
+    def __init__(self, handler):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.httpd.daemon_threads = True
+        self.httpd.fake = self
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def count(self):
+        with self._lock:
+            self.requests += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive，与真实服务一致地复用连接
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _CaiyunHandler(_Handler):
+    def do_GET(self):
+        fake = self.server.fake
+        fake.count()
+        time.sleep(fake.latency)
+        # 路径：/<token>/<经度>,<纬度>/<接口>
+        endpoint = self.path.split("?")[0].rstrip("/").rsplit("/", 1)[-1]
+        payload = fake.payloads.get(endpoint)
+        if payload is None:
+            self.send_json({"status": "failed", "error": f"no recording for {endpoint}"}, 404)
+            return
+        # 以当前时间为 server_time，缓存有效期与线上一致
+        self.send_json(dict(payload, server_time=int(time.time())))
+
+
+class FakeCaiyunServer(_Server):
+    """
+    彩云天气替身：/<token>/<经度>,<纬度>/realtime 返回录制的数据
+    payload: 录制的 JSON 文件（如 cai_yun.py 保存的 weather_data.json），
+    其他接口可通过 payloads={"hourly": {...}} 提供
+    """
+
+    def __init__(self, latency=0.0, payload=CAIYUN_PAYLOAD, payloads=None):
+        super().__init__(_CaiyunHandler)
+        self.latency = latency
+        with open(payload, "r", encoding="utf-8") as f:
+            self.payloads = {"realtime": json.load(f)}
+        self.payloads.update(payloads or {})
+
+
+class _LLMHandler(_Handler):
+    def do_POST(self):
+        fake = self.server.fake
+        fake.count()
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        model = request.get("model", "fake")
+        time.sleep(fake.latency)
+        if not request.get("stream"):
+            self.send_json({
+                "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": fake.text}}],
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for i in range(0, len(fake.text), fake.chunk_size):
+            chunk = {
+                "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "finish_reason": None,
+                             "delta": {"content": fake.text[i:i + fake.chunk_size]}}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(fake.token_delay)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+
+class FakeLLMServer(_Server):
+    """
+    OpenAI 兼容接口替身：POST <url>/chat/completions
+    latency 为首字延迟，之后每 chunk_size 个字间隔 token_delay 秒
+    """
+
+    def __init__(self, latency=0.0, token_delay=0.0, text="薄秋衣+薄秋裤+冲锋衣外壳+冲锋裤外壳。", chunk_size=2):
+        super().__init__(_LLMHandler)
+        self.latency = latency
+        self.token_delay = token_delay
+        self.text = text
+        self.chunk_size = chunk_size
+
+    @property
+    def url(self):
+        return super().url + "/v1"
+
+
+class FakeBleakClient:
+    """
+    BleakClient 替身，支持 read_sensor_data / MonitorSupervisor 用到的接口
+    用 functools.partial(FakeBleakClient, connect_latency=...) 作为 client_factory
+    """
+
+    def __init__(self, address, connect_latency=0.0, read_latency=0.0, notify_interval=1.0,
+                 temperature=21.5, humidity=45.0, battery=90, disconnected_callback=None, **kwargs):
+        self.address = address
+        self.connect_latency = connect_latency
+        self.read_latency = read_latency
+        self.notify_interval = notify_interval
+        self.values = {
+            TEMPERATURE_CHAR: round(temperature * 100).to_bytes(2, "little", signed=True),
+            HUMIDITY_CHAR: round(humidity * 100).to_bytes(2, "little"),
+            BATTERY_CHAR: bytes([battery]),
+        }
+        self.disconnected_callback = disconnected_callback
+        self.is_connected = False
+        self._notify_tasks = []
+
+    @property
+    def name(self):
+        return "LYWSD03MMC"
+
+    async def __aenter__(self):
+        await asyncio.sleep(self.connect_latency)
+        self.is_connected = True
+        return self
+
+    async def __aexit__(self, *exc):
+        for task in self._notify_tasks:
+            task.cancel()
+        self.is_connected = False
+
+    async def read_gatt_char(self, uuid):
+        await asyncio.sleep(self.read_latency)
+        return self.values[uuid]
+
+    async def start_notify(self, uuid, callback):
+        async def notify():
+            while True:
+                await asyncio.sleep(self.notify_interval)
+                callback(uuid, self.values[uuid])
+        self._notify_tasks.append(asyncio.create_task(notify()))
@@ -0,0 +1,122 @@
+"""
+运行全部（或部分）性能测试，结果写入 JSON，便于不同版本之间对比
+
+python -m benchmarks.run [--only weather,sensors] [--quick] [--output results.json] [--compare old.json]
+
+结果格式：{"meta": {时间, git 提交, Python 版本, 平台}, "results": {测试名: 各测试 run() 的返回值}}
+--compare 按相同路径对比两次结果中的数值，输出 旧值 -> 新值 与比值
+"""
+
+import argparse
+import contextlib
+import json
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from benchmarks import bench_import, bench_normalize, bench_presence, bench_sensors, bench_sqlite, bench_weather
+
+SUITES = {
+    "weather": bench_weather.run,
+    "normalize": bench_normalize.run,
+    "sensors": bench_sensors.run,
+    "sqlite": bench_sqlite.run,
+    "import": bench_import.run,
+    "presence": bench_presence.run,
+}
+
+# --quick 时各测试的参数（几十秒内跑完，用于改动后的快速检查）
+QUICK = {
+    "weather": {"seconds": 2.0, "concurrency": 10},
+    "normalize": {"calls": 10000},
+    "sensors": {"rows": 100000, "calls": 500, "seconds": 1.0},
+    "sqlite": {"seconds": 1.0, "rows": 20000},
+    "import": {"n": 50000, "slow_records": 500},
+    "presence": {"frames": 60},
+}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(names=None, quick=False):
+    results = {}
+    for name in names or SUITES:
+        print(f"运行 {name} ...", file=sys.stderr)
+        started = time.perf_counter()
+        try:
+            # 测试过程中的输出转到标准错误，标准输出只保留 JSON
+            with contextlib.redirect_stdout(sys.stderr):
+                results[name] = SUITES[name](**(QUICK[name] if quick else {}))
+        except Exception as e:
+            print(f"{name} 运行失败: {e!r}", file=sys.stderr)
+            results[name] = {"error": repr(e)}
+        print(f"{name} 完成，用时 {time.perf_counter() - started:.1f} 秒", file=sys.stderr)
+    return {
+        "meta": {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": quick,
+        },
+        "results": results,
+    }
+
+def flatten(value, prefix=""):
+    """把嵌套结果展开为 {"a.b.c": 数值}"""
+    if isinstance(value, dict):
+        items = {}
+        for key, child in value.items():
+            items.update(flatten(child, f"{prefix}.{key}" if prefix else str(key)))
+        return items
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix: value}
+    return {}
+
+def compare(old, new, file=None):
+    old_values, new_values = flatten(old["results"]), flatten(new["results"])
+    print(f"对比 {old['meta'].get('commit')} -> {new['meta'].get('commit')}", file=file)
+    for key, value in new_values.items():
+        if key not in old_values:
+            continue
+        before = old_values[key]
+        ratio = f"{value / before:.2f}x" if before else "-"
+        print(f"  {key:<60} {before:>12} -> {value:<12} {ratio}", file=file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="运行性能测试并输出 JSON")
+    parser.add_argument("--only", help=f"逗号分隔的测试名，可选 {','.join(SUITES)}，默认全部")
+    parser.add_argument("--quick", action="store_true", help="使用较小的数据量快速运行")
+    parser.add_argument("--output", help="结果 JSON 路径，默认输出到标准输出")
+    parser.add_argument("--compare", help="与之前保存的结果 JSON 对比")
+    args = parser.parse_args()
+
+    names = args.only.split(",") if args.only else None
+    unknown = [name for name in names or [] if name not in SUITES]
+    if unknown:
+        parser.error(f"未知测试: {','.join(unknown)}")
+
+    report = run(names, args.quick)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"结果已保存到 {args.output}", file=sys.stderr)
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            # JSON 输出到标准输出时，对比结果输出到标准错误
+            compare(json.load(f), report, None if args.output else sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
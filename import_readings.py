@@ -0,0 +1,70 @@
+# pip install bleak bthome-ble numpy
+
+'''
+批量导入历史温湿度数据
+
+python import_readings.py 文件 [--format pvvx-memo|pvvx-adv|atc-adv|jsonl] [--device MAC] [--chunk-size N]
+
+二进制格式见 LYWSD03MMC_db.RECORD_DTYPES，按块用 np.frombuffer 解码，每块一个事务；
+jsonl 为广播扫描模式录制的原始广播（scan_advertisements 的 record_path）。
+导入完成后从最早的导入时间起重新汇总 1分钟/1小时/1天 数据
+'''
+
+import argparse
+import time
+
+from LYWSD03MMC_db import SensorDatabase, RECORD_DTYPES, iter_record_chunks, replay_advertisements
+from services.config import DB_PATH, IMPORT_CHUNK_SIZE
+
+
+def import_file(path, fmt, device_mac=None, chunk_size=IMPORT_CHUNK_SIZE, db_path=DB_PATH):
+    """导入一个文件，返回导入的条数"""
+    db = SensorDatabase(db_path)
+    started = time.perf_counter()
+    total = 0
+    earliest = None
+
+    if fmt == "jsonl":
+        readings = replay_advertisements(path)
+        for start in range(0, len(readings), chunk_size):
+            # 导入过程中不汇总，否则超过保留期的旧数据会在重新汇总前被清理
+            if not db.save_readings(readings[start:start + chunk_size], compact=False):
+                break
+            total = min(start + chunk_size, len(readings))
+        earliest = min((r["ts"] for r in readings), default=None)
+    else:
+        for records in iter_record_chunks(path, fmt, chunk_size):
+            if len(records["ts"]) == 0:
+                continue
+            try:
+                total += db.import_records(records, device_mac)
+            except Exception as e:
+                print(f"✗ 导入失败（已导入 {total} 条）: {e}")
+                break
+            first = int(records["ts"].min())
+            earliest = first if earliest is None else min(earliest, first)
+            print(f"已导入 {total} 条")
+
+    elapsed = time.perf_counter() - started
+    print(f"✓ 共导入 {total} 条，用时 {elapsed:.2f} 秒（{total / max(elapsed, 1e-9):.0f} 条/秒）")
+
+    if earliest is not None:
+        print("正在重新汇总...")
+        db.compact(since=earliest)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量导入历史温湿度数据")
+    parser.add_argument("path", help="数据文件路径")
+    parser.add_argument("--format", default="pvvx-memo", choices=sorted(RECORD_DTYPES) + ["jsonl"],
+                        help="文件格式")
+    parser.add_argument("--device", help="记录中不含设备地址时使用的设备地址（默认 DEVICE_MAC）")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE, help="每个事务导入的记录数")
+    parser.add_argument("--db", default=DB_PATH, help="数据库路径")
+    args = parser.parse_args()
+    import_file(args.path, args.format, args.device, args.chunk_size, args.db)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,44 +1,244 @@
 # pip install fastapi uvicorn
 
-from fastapi import FastAPI
-from fastapi.responses import FileResponse
+import asyncio
+import json
+import sqlite3
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Query, Request, Response
+from fastapi.responses import StreamingResponse
 import uvicorn
 
-from services.cai_yun import get_realtime_weather, process_weather_data
-from services.get_db import get_recent_readings
-from services.clothes_suggest import ask_ai
-from services.config import HOST, PORT
+from services.snapshot import SnapshotRefresher
+from services.forecast import ForecastStore
+from services import cai_yun, clothes_suggest
+from services import metrics
+from services.get_db import get_history, get_device_health, get_sensor_ages, init_schema
+from services.http_cache import StaticFile, Representation, respond, etag_matches, not_modified
+from services.config import (
+    HOST, PORT, EVENTS_KEEPALIVE, CAMERA_ENABLED, CAMERA_QUALITY, CAMERA_STREAM_FPS, PRESENCE_ENABLED,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """启动时创建共享客户端并开启后台刷新任务，关闭时停止"""
+    # 网页服务可能先于蓝牙采集进程启动，旧版数据库在这里完成迁移
+    try:
+        await asyncio.to_thread(init_schema)
+    except sqlite3.Error as e:
+        print(f"初始化数据库失败: {e}")
+    clothes_suggest.init_client()
+    app.state.refresher = SnapshotRefresher()
+    app.state.refresher.start()
+    app.state.forecasts = ForecastStore()
+    _register_gauges(app.state.refresher)
+    app.state.camera = None
+    app.state.presence = None
+    if CAMERA_ENABLED:
+        from services.get_rtsp import open_camera
+        # 多个 worker 时只有一个进程连接摄像头，其余从共享内存读取
+        app.state.camera = open_camera()
+        if PRESENCE_ENABLED:
+            from services.presence import PresenceMonitor
+            loop = asyncio.get_running_loop()
+            refresher = app.state.refresher
+            refresher.set_present(False)
+            app.state.presence = PresenceMonitor(
+                app.state.camera,
+                on_change=lambda present: loop.call_soon_threadsafe(refresher.set_present, present),
+            ).start()
+    yield
+    if app.state.presence is not None:
+        await asyncio.to_thread(app.state.presence.stop)
+    if app.state.camera is not None:
+        await asyncio.to_thread(app.state.camera.stop)
+    await app.state.refresher.stop()
+    await cai_yun.client.aclose()
+    await clothes_suggest.close_client()
+
+def _register_gauges(refresher):
+    """时效类指标在抓取 /metrics 时计算"""
+    metrics.SNAPSHOT_AGE.set_function(lambda: {
+        (location_id,): time.time() - updated for location_id, updated in list(refresher.updated_at.items())
+    })
+    metrics.SENSOR_AGE.set_function(lambda: {(mac,): age for mac, age in get_sensor_ages().items()})
+    # 同一次抓取中两个指标各读一次连接状态表（很小），保持实现简单
+    metrics.SENSOR_CONNECTED.set_function(lambda: {
+        (row["device_mac"],): int(row["connected"]) for row in get_device_health()
+    })
+    metrics.SENSOR_PACKET_AGE.set_function(lambda: {
+        (row["device_mac"],): row["last_packet_age"] for row in get_device_health()
+    })
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(metrics.HTTPMetrics)
 
-app = FastAPI()
+# 页面内容按哈希校验，浏览器每次使用前重新验证，未修改时返回 304
+INDEX_PAGE = StaticFile("index.html", "text/html; charset=utf-8")
+REVALIDATE = "no-cache"
 
 @app.get("/")
-def index():
+def index(request: Request):
     """返回前端页面"""
-    return FileResponse("index.html")
+    return respond(request, INDEX_PAGE.get(), REVALIDATE)
+
+# 地点 -> ((ETag, 快照更新时间), Representation)：同一份快照只序列化/压缩一次
+_weather_bodies = {}
+
+def _weather_representation(refresher, location, etag):
+    """
+    /weather 的响应内容，快照内容或刷新时间变化后才重新生成
+    age 为首次生成时的值（ETag 为弱校验，不含 age）
+    """
+    key = (etag, refresher.updated_at.get(location))
+    cached = _weather_bodies.get(location)
+    if cached is None or cached[0] != key:
+        body = json.dumps(refresher.latest(location), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        cached = (key, Representation(body, etag, "application/json"))
+        # 没有快照（未知地点或尚无数据）时不缓存，避免任意地点参数占用内存
+        if etag is not None:
+            _weather_bodies[location] = cached
+    return cached[1]
 
 @app.get("/weather")
-async def weather():
-    """天气数据API"""
+async def weather(request: Request, location: str = "default"):
+    """天气数据API（返回后台预先计算好的快照，内容未变化时返回 304）"""
+    refresher = app.state.refresher
+    # 仅在启动后的首次刷新完成前需要等待
+    await refresher.ready.wait()
+    etag = refresher.etag(location)
+    if etag_matches(request, etag):
+        return not_modified(etag, REVALIDATE)
+    return respond(request, _weather_representation(refresher, location, etag), REVALIDATE)
+
+@app.get("/advice/stream")
+async def advice_stream(location: str = "default"):
+    """
+    着装建议流式API（Server-Sent Events）
+    按当前快照中的温度生成建议，每段文本为一条 message，结束时发送 done 事件
+    """
+    refresher = app.state.refresher
+
+    async def events():
+        await refresher.ready.wait()
+        snapshot = refresher.snapshots.get(location)
+        if snapshot is None:
+            message = refresher.latest(location).get("error", "数据准备中")
+            yield f"event: error\ndata: {json.dumps({'error': message}, ensure_ascii=False)}\n\n"
+            return
+        try:
+            async for text in clothes_suggest.stream_advice(snapshot["forecast"], snapshot["monitor"]):
+                yield f"data: {json.dumps({'text': text}, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'error': str(e)}, ensure_ascii=False)}\n\n"
+            return
+        yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+@app.get("/events")
+async def events_stream(location: str = "default"):
+    """
+    页面推送API（Server-Sent Events），替代轮询 /weather
+    连接后先发送完整内容，之后仅在 预报/监测/建议 等内容变化时发送变化的字段：
+    data: {"version": 版本号, "full": 是否完整内容, "changes": {字段: 新值}}
+    所有连接共享刷新器的同一次计算，空闲时定期发送注释行作为心跳
+    """
+    refresher = app.state.refresher
+    if location not in refresher.locations:
+        return {"error": f"未知地点: {location}"}
+
+    async def events():
+        async for message in refresher.subscribe(location, keepalive=EVENTS_KEEPALIVE):
+            yield ": ping\n\n" if message is None else f"data: {message}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+@app.get("/forecast")
+async def forecast(location: str = "default", kind: str = "hourly",
+                   start: int = None, end: int = None, fields: str = None):
+    """
+    预报数据API
+    kind: hourly（逐小时）或 daily（逐天）
+    start/end: 时间范围 [start, end)，秒级时间戳，留空表示不限
+    fields: 逗号分隔的字段名，留空返回全部字段
+    """
+    store = app.state.forecasts
+    if location not in store.locations:
+        return {"error": f"未知地点: {location}"}
+    if kind not in ("hourly", "daily"):
+        return {"error": f"未知预报类型: {kind}"}
+    series = await store.get(location, kind)
+    if series is None:
+        return {"error": "预报数据获取失败"}
+    names = fields.split(',') if fields else None
+    unknown = [name for name in names or [] if name not in series.columns]
+    if unknown:
+        return {"error": f"未知字段: {','.join(unknown)}"}
+    result = series.slice(start, end).to_dict(names)
+    result["kind"] = kind
+    return result
+
+@app.get("/history")
+async def history(start: str, end: str = None, device: str = None, points: int = 500):
+    """
+    温湿度历史API
+    start/end: ISO-8601 时间（如 2026-01-01T00:00:00）或毫秒时间戳；end 留空表示当前时间
+    返回的每个数据点 ts 为毫秒时间戳
+    points: 期望的数据点数，用于自动选择汇总层级
+    """
     try:
-        d = await get_realtime_weather() if hasattr(get_realtime_weather, '__await__') else get_realtime_weather()
-        w = process_weather_data(d)
-        m = await get_recent_readings(1) if hasattr(get_recent_readings, '__await__') else get_recent_readings(1)
-        ww = float(w['气温'])
-        tw, tm = round(ww, 1), round(m[0]['temperature'], 1)
-        a = await ask_ai(tw, tm) if hasattr(ask_ai, '__await__') else ask_ai(tw, tm)
-        
-        return {
-            "forecast": tw,
-            "monitor": tm,
-            "weather": w['本地降水强度'],
-            "nearest": w['最近降水距离'],
-            "rain": w['最近降水强度'],
-            "advice": a,
-            "update": w['更新时间']
-        }
+        return await asyncio.to_thread(get_history, start, end, device, points)
     except Exception as e:
         return {"error": str(e)}
 
+@app.get("/camera.jpg")
+def camera_jpg(quality: int = Query(CAMERA_QUALITY, ge=1, le=100)):
+    """摄像头最新一帧（每帧每种画质只编码一次，所有请求共享）"""
+    camera = app.state.camera
+    data = camera.get_frame_bytes(quality) if camera is not None else None
+    if data is None:
+        return Response(status_code=503)
+    return Response(data, media_type="image/jpeg", headers={"Cache-Control": "no-cache"})
+
+@app.get("/camera/stream")
+async def camera_stream(quality: int = Query(CAMERA_QUALITY, ge=1, le=100)):
+    """摄像头 MJPEG 推流（multipart/x-mixed-replace），只在有新帧时发送"""
+    camera = app.state.camera
+    if camera is None:
+        return Response(status_code=503)
+
+    async def frames():
+        sent = 0
+        while True:
+            # 有人观看时才请求解码新帧（drain 模式）
+            camera.request()
+            if camera.frame_id != sent:
+                # 新帧首次编码可能耗时几十毫秒，放到线程中执行
+                data, sent = await asyncio.to_thread(camera.get_frame, quality)
+                if data is not None:
+                    yield (b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: "
+                           + str(len(data)).encode() + b"\r\n\r\n" + data + b"\r\n")
+            await asyncio.sleep(1 / CAMERA_STREAM_FPS)
+
+    return StreamingResponse(frames(), media_type="multipart/x-mixed-replace; boundary=frame",
+                             headers={"Cache-Control": "no-cache"})
+
+@app.get("/sensors/health")
+async def sensors_health(device: str = None):
+    """温湿度计连接状态API（实时监控模式写入）"""
+    return await asyncio.to_thread(get_device_health, device)
+
+@app.get("/metrics")
+async def metrics_text():
+    """Prometheus 文本格式的监控指标（上游耗时/失败、缓存命中、数据时效）"""
+    # 时效指标需要读数据库，放到线程中执行
+    body = await asyncio.to_thread(metrics.render)
+    return Response(body, media_type=metrics.CONTENT_TYPE)
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host=HOST, port=PORT, reload=True)
-
@@ -2,6 +2,12 @@
 cai_yun.py          # 彩云天气API接口封装
 clothes_suggest.py  # AI着装建议生成服务
 config.py           # 配置文件（需用户编辑）
+forecast.py         # 逐小时/逐天预报的列式内存存储
 get_db.py           # 本地温湿度数据库查询接口
-get_rtsp.py         # RTSP摄像头接口（预留功能）
+http_cache.py       # ETag 条件请求与响应压缩
+get_rtsp.py         # RTSP摄像头取帧（按需解码，多进程共享内存帧缓冲）
+metrics.py          # Prometheus 文本格式监控指标（/metrics）
+presence.py         # 摄像头有人检测（唤醒显示、无人时暂停刷新）
+precompute_advice.py  # 离线预计算着装建议查找表
+snapshot.py         # /weather 数据后台定时刷新
 """
\ No newline at end of file
@@ -1,129 +1,359 @@
-# pip install requests
+# pip install httpx
 
-import requests
+import asyncio
+import bisect
+import httpx
 import json
-from datetime import datetime
+import os
+import random
+import time
+from dataclasses import dataclass
+from typing import Optional
 
-from services.config import CAIYUN_TOKEN, LONGITUDE, LATITUDE
+from services.metrics import track, CACHE_REQUESTS
+from services.config import (
+    CAIYUN_TOKEN, LONGITUDE, LATITUDE,
+    CAIYUN_CACHE_TTL, CAIYUN_CACHE_MAX_STALE, CAIYUN_CACHE_FILE,
+    CAIYUN_API_BASE, CAIYUN_TIMEOUT, CAIYUN_RETRIES, CAIYUN_BACKOFF,
+    CAIYUN_CONCURRENCY, CAIYUN_COORD_PRECISION,
+)
 
-def get_realtime_weather():
+
+class CaiyunClient:
     """
-    获取彩云天气实时数据
+    彩云天气异步客户端
+    共享连接池（keep-alive），失败时按带抖动的指数退避重试；
+    相同坐标和接口的并发请求只向上游发出一次（singleflight），
+    同时进行的上游请求数不超过 concurrency
     """
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/143.0.0.0 Safari/537.36'
-    }
-    api_url = f"https://api.caiyunapp.com/v2.6/{CAIYUN_TOKEN}/{LONGITUDE},{LATITUDE}/realtime"  # ①使用官方文档中的token测试, 稳定需注册api. ②经纬度需换成所在地区经纬度. 
-    try:
-        response = requests.get(api_url, headers=headers, timeout=10)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"请求API时发生错误: {e}")
-        return None
-    except json.JSONDecodeError as e:
-        print(f"解析JSON数据时发生错误: {e}")
-        return None
+
+    def __init__(self, base_url=CAIYUN_API_BASE, token=CAIYUN_TOKEN, timeout=CAIYUN_TIMEOUT,
+                 retries=CAIYUN_RETRIES, backoff=CAIYUN_BACKOFF, concurrency=CAIYUN_CONCURRENCY,
+                 transport=None):
+        self.base_url = base_url.rstrip('/')
+        self.token = token
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.transport = transport  # 测试时可传入 httpx.MockTransport
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._client = None
+        self._inflight = {}  # (经度, 纬度, 接口, 参数) -> asyncio.Task
+
+    def _http(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=f"{self.base_url}/{self.token}",
+                headers={
+                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/143.0.0.0 Safari/537.36'
+                },
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=5),
+                transport=self.transport,
+            )
+        return self._client
+
+    async def fetch(self, longitude, latitude, endpoint="realtime", params=None):
+        """
+        请求一个接口，返回解析后的JSON，失败返回 None
+        """
+        key = (str(longitude), str(latitude), endpoint, tuple(sorted((params or {}).items())))
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch_with_retry(longitude, latitude, endpoint, params))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: 某个调用方被取消时不影响其他等待同一请求的调用方
+        return await asyncio.shield(task)
+
+    async def _fetch_with_retry(self, longitude, latitude, endpoint, params):
+        url = f"/{longitude},{latitude}/{endpoint}"  # ①使用官方文档中的token测试, 稳定需注册api. ②经纬度需换成所在地区经纬度. 
+        with track("caiyun", endpoint) as t:
+            for attempt in range(self.retries + 1):
+                try:
+                    async with self._semaphore:
+                        response = await self._http().get(url, params=params)
+                    response.raise_for_status()
+                    return response.json()
+                except httpx.HTTPStatusError as e:
+                    status = e.response.status_code
+                    if status != 429 and status < 500:
+                        print(f"请求API时发生错误: {e}")
+                        t.fail()
+                        return None
+                    error = e
+                except httpx.TransportError as e:
+                    error = e
+                except json.JSONDecodeError as e:
+                    print(f"解析JSON数据时发生错误: {e}")
+                    t.fail()
+                    return None
+
+                if attempt < self.retries:
+                    # 全抖动指数退避：在 [0, backoff * 2^attempt] 中随机等待
+                    await asyncio.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+            print(f"请求API时发生错误（已重试{self.retries}次）: {error}")
+            t.fail()
+            return None
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class ResponseCache:
+    """
+    彩云天气响应缓存
+    键为 (token, 经度, 纬度, 接口)，有效期从数据的 server_time 算起；
+    过期后先返回旧数据，同时只发起一次后台刷新（stale-while-revalidate）
+    """
+
+    def __init__(self, ttl=CAIYUN_CACHE_TTL, max_stale=CAIYUN_CACHE_MAX_STALE, path=CAIYUN_CACHE_FILE):
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.path = path
+        self._entries = {}     # key -> {"data": ..., "expires": 过期时间戳}
+        self._refreshing = {}  # key -> asyncio.Task，正在进行的刷新
+        self._load()
+
+    async def get(self, key, fetch):
+        """
+        读取缓存；未命中或过期太久时等待请求，轻度过期时后台刷新
+        fetch: 无参协程函数，返回API原始数据，失败返回 None
+        """
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if now < entry["expires"]:
+                CACHE_REQUESTS.inc("caiyun", "hit")
+                return entry["data"]
+            if now < entry["expires"] + self.max_stale:
+                CACHE_REQUESTS.inc("caiyun", "stale")
+                self._refresh(key, fetch)
+                return entry["data"]
+        CACHE_REQUESTS.inc("caiyun", "miss")
+        await asyncio.shield(self._refresh(key, fetch))
+        entry = self._entries.get(key)
+        # 刷新失败时旧数据仍在缓存中，过期超过 max_stale 的不再返回
+        if entry is None or time.time() >= entry["expires"] + self.max_stale:
+            return None
+        return entry["data"]
+
+    def _refresh(self, key, fetch):
+        """同一个键同时只有一个刷新任务"""
+        task = self._refreshing.get(key)
+        if task is None:
+            task = self._refreshing[key] = asyncio.create_task(self._fetch_and_store(key, fetch))
+        return task
+
+    async def _fetch_and_store(self, key, fetch):
+        try:
+            data = await fetch()
+            if data and data.get('status') == 'ok':
+                server_time = data.get('server_time') or time.time()
+                self._entries[key] = {"data": data, "expires": server_time + self.ttl}
+                if self.path:
+                    await asyncio.to_thread(self._save, list(self._entries.items()))
+        except Exception as e:
+            print(f"刷新天气缓存失败: {e}")
+        finally:
+            del self._refreshing[key]
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            self._entries = {tuple(item["key"]): item["entry"] for item in saved}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"读取天气缓存失败: {e}")
+
+    def _save(self, items):
+        saved = [{"key": list(k), "entry": v} for k, v in items]
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(saved, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"保存天气缓存失败: {e}")
+
+
+client = CaiyunClient()
+_cache = ResponseCache()
+
+
+def snap_to_grid(longitude, latitude):
+    """
+    按 CAIYUN_COORD_PRECISION 对坐标取整，返回用于请求和缓存的坐标字符串
+    未设置精度（None）时按原样使用配置的坐标
+    """
+    if CAIYUN_COORD_PRECISION is None:
+        return str(longitude), str(latitude)
+    return (f"{float(longitude):.{CAIYUN_COORD_PRECISION}f}",
+            f"{float(latitude):.{CAIYUN_COORD_PRECISION}f}")
+
+async def fetch_realtime_weather(longitude=LONGITUDE, latitude=LATITUDE):
+    """
+    异步获取彩云天气实时数据（带缓存）
+    """
+    longitude, latitude = snap_to_grid(longitude, latitude)
+    key = (client.token, longitude, latitude, "realtime")
+    return await _cache.get(key, lambda: client.fetch(longitude, latitude, "realtime"))
+
+async def fetch_forecast(longitude=LONGITUDE, latitude=LATITUDE, kind="hourly", steps=48):
+    """
+    异步获取彩云天气逐小时（hourly）或逐天（daily）预报（带缓存）
+    """
+    longitude, latitude = snap_to_grid(longitude, latitude)
+    params = {f"{kind}steps": steps}
+    key = (client.token, longitude, latitude, f"{kind}?{kind}steps={steps}")
+    return await _cache.get(key, lambda: client.fetch(longitude, latitude, kind, params))
+
+def get_realtime_weather(longitude=LONGITUDE, latitude=LATITUDE):
+    """
+    获取彩云天气实时数据（同步版本，供命令行使用）
+    """
+    async def _run():
+        try:
+            return await fetch_realtime_weather(longitude, latitude)
+        finally:
+            await client.aclose()
+    return asyncio.run(_run())
+
+# 降水强度分级：强度 < 下一个边界时取对应描述
+INTENSITY_BOUNDS = (0.031, 0.25, 0.35, 0.48)
+INTENSITY_LABELS = ("无雨/雪", "小雨/雪", "中雨/雪", "大雨/雪", "暴雨/雪")
+
+SKYCON_MAP = {
+    "PARTLY_CLOUDY_DAY": "多云（白天）",
+    "PARTLY_CLOUDY_NIGHT": "多云（夜晚）",
+    "CLEAR_DAY": "晴（白天）",
+    "CLEAR_NIGHT": "晴（夜晚）",
+    "CLOUDY": "阴",
+    "LIGHT_RAIN": "小雨",
+    "MODERATE_RAIN": "中雨",
+    "HEAVY_RAIN": "大雨",
+    "STORM_RAIN": "暴雨",
+    "LIGHT_SNOW": "小雪",
+    "MODERATE_SNOW": "中雪",
+    "HEAVY_SNOW": "大雪",
+    "STORM_SNOW": "暴雪"
+}
+
+_EMPTY = {}
+
 
 def convert_intensity_to_description(intensity):
     """
     将降水强度值转换为易读的描述
     """
-    if intensity < 0.031:
-        return "无雨/雪"
-    elif 0.031 <= intensity < 0.25:
-        return "小雨/雪"
-    elif 0.25 <= intensity < 0.35:
-        return "中雨/雪"
-    elif 0.35 <= intensity < 0.48:
-        return "大雨/雪"
-    else:
-        return "暴雨/雪"
+    return INTENSITY_LABELS[bisect.bisect_right(INTENSITY_BOUNDS, intensity)]
+
+
+@dataclass(slots=True)
+class WeatherSnapshot:
+    """
+    彩云天气实时数据中关注的内容，数值保持为数字，缺失为 None
+    描述文字与更新时间在用到时才生成；to_dict() 输出命令行展示用的中文字段
+    """
+    server_time: int
+    temperature: Optional[float]
+    apparent_temperature: Optional[float]
+    humidity: Optional[float]          # %
+    skycon: Optional[str]
+    local_intensity: Optional[float]
+    nearest_distance: Optional[float]  # 公里
+    nearest_intensity: Optional[float]
+    wind_speed: Optional[float]        # 公里/小时
+    wind_direction: Optional[float]    # 度
+    pressure: Optional[float]          # 百帕
+    visibility: Optional[float]        # 公里
+    aqi: Optional[float]
+    pm25: Optional[float]
+
+    @property
+    def update_time(self):
+        return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.server_time))
+
+    @property
+    def skycon_desc(self):
+        return SKYCON_MAP.get(self.skycon, self.skycon)
+
+    @property
+    def local_intensity_desc(self):
+        return None if self.local_intensity is None else convert_intensity_to_description(self.local_intensity)
+
+    @property
+    def nearest_intensity_desc(self):
+        return None if self.nearest_intensity is None else convert_intensity_to_description(self.nearest_intensity)
+
+    def to_dict(self):
+        """转换为原先的中文字段字典（数值格式化为文字，缺失为 'N/A'）"""
+        def text(value, fmt=""):
+            return 'N/A' if value is None else format(value, fmt)
+        def raw(value):
+            return 'N/A' if value is None else value
+        return {
+            '更新时间': self.update_time,
+            '气温': text(self.temperature),
+            '体感温度': text(self.apparent_temperature),
+            '湿度': text(self.humidity),
+            '天气状况': raw(self.skycon_desc),
+            '本地降水强度': raw(self.local_intensity_desc),
+            '本地降水强度值': raw(self.local_intensity),
+            '最近降水距离': text(self.nearest_distance),
+            '最近降水强度': raw(self.nearest_intensity_desc),
+            '最近降水强度值': raw(self.nearest_intensity),
+            '风速': text(self.wind_speed),
+            '风向': text(self.wind_direction),
+            '气压': text(self.pressure, ".1f"),
+            '能见度': text(self.visibility),
+            '空气质量指数(AQI)': raw(self.aqi),
+            'PM2.5': text(self.pm25)
+        }
+
 
 def process_weather_data(data):
     """
-    处理天气数据，提取并转换关注的内容
+    处理天气数据，提取关注的内容，返回 WeatherSnapshot，失败返回 None
     """
     if not data or data.get('status') != 'ok':
         print("获取数据失败或数据状态异常")
         return None
     
-    result = data.get('result', {})
-    realtime = result.get('realtime', {})
-    
+    realtime = data.get('result', _EMPTY).get('realtime')
     if not realtime:
         print("实时数据为空")
         return None
     
-    # 1. 更新时间转换
-    server_time = data.get('server_time', 0)
-    update_time = datetime.fromtimestamp(server_time).strftime('%Y-%m-%d %H:%M:%S')
-    
-    # 2. 气温
-    temperature = realtime.get('temperature', 'N/A')
-    
-    # 3. 湿度转换
-    humidity_raw = realtime.get('humidity', 0)
-    humidity_percent = round(humidity_raw * 100, 1) if humidity_raw != 'N/A' else 'N/A'
-    
-    # 4. 本地降水强度
-    local_precipitation = realtime.get('precipitation', {}).get('local', {})
-    local_intensity_raw = local_precipitation.get('intensity', 'N/A')
-    local_intensity_desc = convert_intensity_to_description(local_intensity_raw) if local_intensity_raw != 'N/A' else 'N/A'
-    
-    # 5. 最近降水距离
-    nearest_precipitation = realtime.get('precipitation', {}).get('nearest', {})
-    nearest_distance = nearest_precipitation.get('distance', 'N/A')
-    
-    # 6. 最近降水强度
-    nearest_intensity_raw = nearest_precipitation.get('intensity', 'N/A')
-    nearest_intensity_desc = convert_intensity_to_description(nearest_intensity_raw) if nearest_intensity_raw != 'N/A' else 'N/A'
-    
-    # 提取更多有用信息（可选）
-    skycon_map = {
-        "PARTLY_CLOUDY_DAY": "多云（白天）",
-        "PARTLY_CLOUDY_NIGHT": "多云（夜晚）",
-        "CLEAR_DAY": "晴（白天）",
-        "CLEAR_NIGHT": "晴（夜晚）",
-        "CLOUDY": "阴",
-        "LIGHT_RAIN": "小雨",
-        "MODERATE_RAIN": "中雨",
-        "HEAVY_RAIN": "大雨",
-        "STORM_RAIN": "暴雨",
-        "LIGHT_SNOW": "小雪",
-        "MODERATE_SNOW": "中雪",
-        "HEAVY_SNOW": "大雪",
-        "STORM_SNOW": "暴雪"
-    }
-    
-    skycon = realtime.get('skycon', 'N/A')
-    skycon_desc = skycon_map.get(skycon, skycon)
-    
-    wind = realtime.get('wind', {})
-    wind_speed = wind.get('speed', 'N/A')
-    wind_direction = wind.get('direction', 'N/A')
-    
-    air_quality = realtime.get('air_quality', {})
-    aqi = air_quality.get('aqi', {}).get('chn', 'N/A')
+    get = realtime.get
+    precipitation = get('precipitation') or _EMPTY
+    local = precipitation.get('local') or _EMPTY
+    nearest = precipitation.get('nearest') or _EMPTY
+    wind = get('wind') or _EMPTY
+    air_quality = get('air_quality') or _EMPTY
+    humidity = get('humidity', 0)
+    pressure = get('pressure')
     
-    return {
-        '更新时间': update_time,
-        '气温': f"{temperature}" if temperature != 'N/A' else 'N/A',
-        '体感温度': f"{realtime.get('apparent_temperature', 'N/A')}" if realtime.get('apparent_temperature') != 'N/A' else 'N/A',
-        '湿度': f"{humidity_percent}" if humidity_percent != 'N/A' else 'N/A',
-        '天气状况': skycon_desc,
-        '本地降水强度': local_intensity_desc,
-        '本地降水强度值': local_intensity_raw,
-        '最近降水距离': f"{nearest_distance}" if nearest_distance != 'N/A' else 'N/A',
-        '最近降水强度': nearest_intensity_desc,
-        '最近降水强度值': nearest_intensity_raw,
-        '风速': f"{wind_speed}" if wind_speed != 'N/A' else 'N/A',
-        '风向': f"{wind_direction}" if wind_direction != 'N/A' else 'N/A',
-        '气压': f"{realtime.get('pressure', 'N/A')/100:.1f}" if realtime.get('pressure') != 'N/A' else 'N/A',
-        '能见度': f"{realtime.get('visibility', 'N/A')}" if realtime.get('visibility') != 'N/A' else 'N/A',
-        '空气质量指数(AQI)': aqi,
-        'PM2.5': f"{air_quality.get('pm25', 'N/A')}" if air_quality.get('pm25') != 'N/A' else 'N/A'
-    }
+    return WeatherSnapshot(
+        server_time=data.get('server_time', 0),
+        temperature=get('temperature'),
+        apparent_temperature=get('apparent_temperature'),
+        humidity=None if humidity is None else round(humidity * 100, 1),
+        skycon=get('skycon'),
+        local_intensity=local.get('intensity'),
+        nearest_distance=nearest.get('distance'),
+        nearest_intensity=nearest.get('intensity'),
+        wind_speed=wind.get('speed'),
+        wind_direction=wind.get('direction'),
+        pressure=None if pressure is None else pressure / 100,
+        visibility=get('visibility'),
+        aqi=(air_quality.get('aqi') or _EMPTY).get('chn'),
+        pm25=air_quality.get('pm25'),
+    )
 
 def display_weather_info(weather_info):
     """
@@ -131,6 +361,8 @@ def display_weather_info(weather_info):
     """
     if not weather_info:
         return
+    if isinstance(weather_info, WeatherSnapshot):
+        weather_info = weather_info.to_dict()
     
     print("=" * 50)
     print("彩云天气实时数据")
@@ -1,49 +1,249 @@
 # pip install openai
 
+import asyncio
+import hashlib
+import json
 import os
 import textwrap
-from openai import OpenAI
+import threading
+import time
+from collections import OrderedDict
+from openai import AsyncOpenAI
 
-from services.config import AI_API_KEY, AI_BASE_URL
+from services.metrics import track, CACHE_REQUESTS, UPSTREAM_SECONDS
+from services.config import (
+    AI_API_KEY, AI_BASE_URL,
+    ADVICE_BUCKET_OUT, ADVICE_BUCKET_IN, ADVICE_CACHE_SIZE, ADVICE_CACHE_TTL, ADVICE_CACHE_FILE,
+    ADVICE_TABLE_FILE,
+)
 
-def ask_ai(tmp_out, tmp_in): 
-    prompt_sys = """
-        # 角色
-        你的专属衣物管理与搭配师。
-
-        # 库存（仅根据以下衣物推荐）
-        * 【必备】薄秋衣、薄秋裤；
-        * 软壳三合一冲锋衣（含外壳+抓绒内胆）；
-        * 软壳三合一冲锋裤（含外壳+抓绒内胆）；
-
-        # 穿搭指令
-        1. 场景：室内与室外切换。
-        2. 组合：利用库存中的衣物，组合出一套适合当前温度的穿搭。
-        3. 特别提示：请考虑通勤与室内办公的便利性。
-
-        # 输出限制
-        1. **字数**：严格 ≤ 140字。
-        2. **内容**：仅包含“推荐搭配”的具体内容。
-        3. **禁止行为**：严禁任何背景介绍、分析、总结、语气词。
-        4. **格式**：直接列出衣物组合，不要分段，不要列表符号。
-
-        # 响应示例（仅作参考，不要模仿语气）
-        薄秋衣+薄秋裤+冲锋衣外壳+冲锋裤外壳。
+MODEL = "mimo-v2-flash"
+
+PROMPT_SYS = textwrap.dedent("""
+    # 角色
+    你的专属衣物管理与搭配师。
+
+    # 库存（仅根据以下衣物推荐）
+    * 【必备】薄秋衣、薄秋裤；
+    * 软壳三合一冲锋衣（含外壳+抓绒内胆）；
+    * 软壳三合一冲锋裤（含外壳+抓绒内胆）；
+
+    # 穿搭指令
+    1. 场景：室内与室外切换。
+    2. 组合：利用库存中的衣物，组合出一套适合当前温度的穿搭。
+    3. 特别提示：请考虑通勤与室内办公的便利性。
+
+    # 输出限制
+    1. **字数**：严格 ≤ 140字。
+    2. **内容**：仅包含“推荐搭配”的具体内容。
+    3. **禁止行为**：严禁任何背景介绍、分析、总结、语气词。
+    4. **格式**：直接列出衣物组合，不要分段，不要列表符号。
+
+    # 响应示例（仅作参考，不要模仿语气）
+    薄秋衣+薄秋裤+冲锋衣外壳+冲锋裤外壳。
+""")
+
+
+def prompt_signature(bucket_out=ADVICE_BUCKET_OUT, bucket_in=ADVICE_BUCKET_IN):
+    """模型、提示词与分桶宽度的哈希；任一项变化后，旧的缓存与查找表自动失效"""
+    signature = f"{MODEL}\n{bucket_out}\n{bucket_in}\n{PROMPT_SYS}"
+    return hashlib.sha256(signature.encode('utf-8')).hexdigest()[:16]
+
+
+class AdviceCache:
+    """
+    着装建议缓存
+    键为 (提示词与模型的哈希, 室外温度桶, 室内温度桶)，按LRU淘汰并带有效期，可落盘
     """
 
-    prompt_user = f"室外气温{tmp_out}，室内气温{tmp_in}，请推荐适合当前温度的穿搭组合。"
+    def __init__(self, bucket_out=ADVICE_BUCKET_OUT, bucket_in=ADVICE_BUCKET_IN, max_size=ADVICE_CACHE_SIZE,
+                 ttl=ADVICE_CACHE_TTL, path=ADVICE_CACHE_FILE):
+        self.bucket_out = bucket_out
+        self.bucket_in = bucket_in
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self.prefix = prompt_signature(bucket_out, bucket_in)
+        self._entries = OrderedDict()  # key -> {"advice": ..., "created": 时间戳}
+        self._lock = threading.Lock()
+        self._load()
 
-    client = OpenAI(
-        api_key = AI_API_KEY, 
-        base_url = AI_BASE_URL
-    )
+    def key(self, tmp_out, tmp_in):
+        return f"{self.prefix}:{round(tmp_out / self.bucket_out)}:{round(tmp_in / self.bucket_in)}"
 
-    completion = client.chat.completions.create(
-        model = "mimo-v2-flash", 
+    def get(self, tmp_out, tmp_in):
+        """命中返回建议文本，未命中或已过期返回 None"""
+        key = self.key(tmp_out, tmp_in)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry["created"] > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry["advice"]
+
+    def put(self, tmp_out, tmp_in, advice):
+        """保存建议；空白建议（模型未返回内容）不缓存，下次重新请求"""
+        if not advice or not advice.strip():
+            return
+        key = self.key(tmp_out, tmp_in)
+        with self._lock:
+            self._entries[key] = {"advice": advice, "created": time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            items = list(self._entries.items())
+        self._save(items)
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            # 文件中按从旧到新的顺序保存，恢复后保持LRU顺序
+            for key, entry in saved:
+                if key.startswith(self.prefix):
+                    self._entries[key] = entry
+        except (OSError, ValueError, TypeError) as e:
+            print(f"读取建议缓存失败: {e}")
+
+    def _save(self, items):
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(items, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"保存建议缓存失败: {e}")
+
+
+class AdviceTable:
+    """
+    预计算的着装建议查找表
+    网格点为分桶宽度的整数倍，与 AdviceCache 的温度桶一一对应；
+    cells 按行（室外）展开为一维，存放 texts 的下标，-1 表示缺失
+    """
+
+    def __init__(self, signature, out_range, in_range, texts, cells,
+                 bucket_out=ADVICE_BUCKET_OUT, bucket_in=ADVICE_BUCKET_IN):
+        self.signature = signature
+        self.out_range = out_range  # (最小桶号, 最大桶号)
+        self.in_range = in_range
+        self.texts = texts
+        self.cells = cells
+        self.bucket_out = bucket_out
+        self.bucket_in = bucket_in
+        self._width = in_range[1] - in_range[0] + 1
+
+    def index(self, k_out, k_in):
+        return (k_out - self.out_range[0]) * self._width + (k_in - self.in_range[0])
+
+    def lookup(self, tmp_out, tmp_in):
+        """取最近的网格点，超出范围时取边界；该点缺失（或旧版表中为空白建议）返回 None"""
+        k_out = min(max(round(tmp_out / self.bucket_out), self.out_range[0]), self.out_range[1])
+        k_in = min(max(round(tmp_in / self.bucket_in), self.in_range[0]), self.in_range[1])
+        i = self.cells[self.index(k_out, k_in)]
+        text = self.texts[i] if i >= 0 else None
+        return text if text and text.strip() else None
+
+    def to_json(self):
+        return {
+            "signature": self.signature,
+            "out": list(self.out_range),
+            "in": list(self.in_range),
+            "texts": self.texts,
+            "cells": self.cells,
+        }
+
+    @classmethod
+    def load(cls, path=ADVICE_TABLE_FILE):
+        """读取查找表；文件不存在或与当前提示词不匹配时返回 None"""
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            table = cls(saved["signature"], tuple(saved["out"]), tuple(saved["in"]),
+                        saved["texts"], saved["cells"])
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"读取建议查找表失败: {e}")
+            return None
+        if table.signature != prompt_signature():
+            print("建议查找表与当前模型/提示词不匹配，已忽略")
+            return None
+        return table
+
+
+_cache = AdviceCache()
+_table = AdviceTable.load()
+_client = None
+_generating = {}  # 缓存键 -> 正在进行的 _Generation
+
+
+def init_client():
+    """创建全局共享的AI客户端（复用连接池），应用启动时调用"""
+    global _client
+    if _client is None:
+        _client = AsyncOpenAI(
+            api_key = AI_API_KEY, 
+            base_url = AI_BASE_URL
+        )
+    return _client
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+class _Generation:
+    """一次正在进行的建议生成，同一温度桶的多个调用方共享同一个上游流"""
+
+    def __init__(self):
+        self.parts = []
+        self.done = False
+        self.error = None
+        self.task = None
+        self._updated = asyncio.Event()
+
+    def publish(self, text=None, error=None, done=False):
+        if text:
+            self.parts.append(text)
+        self.error = error
+        self.done = done
+        # 唤醒当前所有等待者，并为下一次更新准备新的事件
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    async def follow(self):
+        """从头回放已生成的内容，然后继续跟随直到结束"""
+        i = 0
+        while True:
+            while i < len(self.parts):
+                yield self.parts[i]
+                i += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._updated.wait()
+
+
+async def request_completion(tmp_out, tmp_in, stream=False):
+    """向模型请求着装建议，不经过缓存"""
+    prompt_user = f"室外气温{tmp_out}，室内气温{tmp_in}，请推荐适合当前温度的穿搭组合。"
+    return await init_client().chat.completions.create(
+        model = MODEL, 
         messages = [
             {
                 "role": "system", 
-                "content": textwrap.dedent(prompt_sys)
+                "content": PROMPT_SYS
             },
             {
                 "role": "user",
@@ -53,7 +253,7 @@ def ask_ai(tmp_out, tmp_in):
         max_completion_tokens = 1024,
         temperature = 0.3,
         top_p = 0.95,
-        stream = False,
+        stream = stream,
         stop = None,
         frequency_penalty = 0,
         presence_penalty = 0,
@@ -62,8 +262,78 @@ def ask_ai(tmp_out, tmp_in):
         }
     )
 
-    print(completion.choices[0].message.content)
-    return completion.choices[0].message.content
+async def _generate(key, generation, tmp_out, tmp_in):
+    with track("llm", "stream_advice") as t:
+        try:
+            start = time.perf_counter()
+            stream = await request_completion(tmp_out, tmp_in, stream=True)
+            async for chunk in stream:
+                text = chunk.choices[0].delta.content if chunk.choices else None
+                if text:
+                    if not generation.parts:
+                        UPSTREAM_SECONDS.observe(time.perf_counter() - start, "llm", "first_token")
+                    generation.publish(text)
+            advice = "".join(generation.parts)
+            if advice.strip():
+                # 写缓存会落盘，放到线程中执行
+                await asyncio.to_thread(_cache.put, tmp_out, tmp_in, advice)
+            generation.publish(done=True)
+        except Exception as e:
+            print(f"生成着装建议失败: {e}")
+            t.fail()
+            generation.publish(error=e, done=True)
+        finally:
+            # 任务被取消（如服务关闭）时也要结束共享的生成，否则等待中的调用方会一直挂起
+            if not generation.done:
+                generation.publish(error=RuntimeError("着装建议生成已取消"), done=True)
+            del _generating[key]
+
+def cached_advice(tmp_out, tmp_in):
+    """只查缓存和预计算查找表，不请求模型；均未命中返回 None"""
+    advice = _cache.get(tmp_out, tmp_in)
+    if advice is not None:
+        CACHE_REQUESTS.inc("advice", "hit")
+        return advice
+    if _table is not None:
+        advice = _table.lookup(tmp_out, tmp_in)
+    CACHE_REQUESTS.inc("advice", "miss" if advice is None else "table")
+    return advice
+
+async def stream_advice(tmp_out, tmp_in):
+    """
+    逐段生成着装建议（异步生成器）
+    命中缓存或查找表时一次性返回整段建议；否则边生成边返回，结束后写入缓存。
+    同一温度桶同时只向模型发起一次请求，调用方断开也不会中断生成
+    """
+    advice = cached_advice(tmp_out, tmp_in)
+    if advice is not None:
+        yield advice
+        return
+
+    key = _cache.key(tmp_out, tmp_in)
+    generation = _generating.get(key)
+    if generation is None:
+        generation = _generating[key] = _Generation()
+        generation.task = asyncio.create_task(_generate(key, generation, tmp_out, tmp_in))
+    async for text in generation.follow():
+        yield text
+
+async def ask_ai_async(tmp_out, tmp_in):
+    """返回完整的着装建议"""
+    return "".join([text async for text in stream_advice(tmp_out, tmp_in)])
+
+def ask_ai(tmp_out, tmp_in): 
+    """
+    获取着装建议（同步版本，供命令行使用）
+    """
+    async def _run():
+        try:
+            return await ask_ai_async(tmp_out, tmp_in)
+        finally:
+            await close_client()
+    advice = asyncio.run(_run())
+    print(advice)
+    return advice
     
     
 if __name__ == "__main__":
@@ -0,0 +1,154 @@
+# pip install numpy
+
+import numpy as np
+from datetime import datetime
+
+from services.cai_yun import fetch_forecast
+from services.config import LOCATIONS, FORECAST_HOURLY_STEPS, FORECAST_DAILY_STEPS
+
+
+class ForecastSeries:
+    """
+    一组共享时间索引的预报序列（列式存储）
+    timestamps: int64 时间戳（秒），升序
+    columns: {字段名: 与 timestamps 等长的 NumPy 数组}
+    """
+
+    def __init__(self, timestamps, columns):
+        self.timestamps = timestamps
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def slice(self, start=None, end=None):
+        """
+        取 [start, end) 时间范围内的数据，返回数组视图，不复制数据
+        """
+        lo = 0 if start is None else np.searchsorted(self.timestamps, start, side='left')
+        hi = len(self.timestamps) if end is None else np.searchsorted(self.timestamps, end, side='left')
+        return ForecastSeries(
+            self.timestamps[lo:hi],
+            {name: values[lo:hi] for name, values in self.columns.items()},
+        )
+
+    def to_dict(self, fields=None):
+        """
+        转换为按列组织的可JSON序列化字典，缺失值为 None
+        """
+        result = {"timestamps": self.timestamps.tolist()}
+        for name in fields or self.columns:
+            values = self.columns[name]
+            if values.dtype.kind == 'f' and np.isnan(values).any():
+                values = np.where(np.isnan(values), None, values)
+            result[name] = values.tolist()
+        return result
+
+
+def _timestamps(items, time_key):
+    """把 ISO-8601 时间字符串转换为 int64 时间戳（秒）"""
+    return np.array(
+        [int(datetime.fromisoformat(item[time_key]).timestamp()) for item in items],
+        dtype=np.int64,
+    )
+
+def _column(items, n, *path):
+    """从 [{...}, ...] 中按路径取出数值字段，组成长度为 n 的 float64 数组"""
+    out = np.full(n, np.nan)
+    for i, item in enumerate(items[:n]):
+        for key in path:
+            item = item.get(key) if isinstance(item, dict) else None
+        if isinstance(item, (int, float)):
+            out[i] = item
+    return out
+
+def _text_column(items, n, key='value'):
+    out = np.full(n, '', dtype=object)
+    for i, item in enumerate(items[:n]):
+        out[i] = item.get(key, '')
+    return out
+
+def parse_hourly(data):
+    """
+    解析 hourly 接口数据，失败返回 None
+    """
+    if not data or data.get('status') != 'ok':
+        return None
+    hourly = data.get('result', {}).get('hourly', {})
+    temperature = hourly.get('temperature', [])
+    if not temperature:
+        return None
+
+    n = len(temperature)
+    air_quality = hourly.get('air_quality', {})
+    return ForecastSeries(_timestamps(temperature, 'datetime'), {
+        "temperature": _column(temperature, n, 'value'),
+        "apparent_temperature": _column(hourly.get('apparent_temperature', []), n, 'value'),
+        "humidity": _column(hourly.get('humidity', []), n, 'value'),
+        "precipitation": _column(hourly.get('precipitation', []), n, 'value'),
+        "precipitation_probability": _column(hourly.get('precipitation', []), n, 'probability'),
+        "wind_speed": _column(hourly.get('wind', []), n, 'speed'),
+        "wind_direction": _column(hourly.get('wind', []), n, 'direction'),
+        "aqi": _column(air_quality.get('aqi', []), n, 'value', 'chn'),
+        "pm25": _column(air_quality.get('pm25', []), n, 'value'),
+        "skycon": _text_column(hourly.get('skycon', []), n),
+    })
+
+def parse_daily(data):
+    """
+    解析 daily 接口数据，失败返回 None
+    """
+    if not data or data.get('status') != 'ok':
+        return None
+    daily = data.get('result', {}).get('daily', {})
+    temperature = daily.get('temperature', [])
+    if not temperature:
+        return None
+
+    n = len(temperature)
+    precipitation = daily.get('precipitation', [])
+    wind = daily.get('wind', [])
+    aqi = daily.get('air_quality', {}).get('aqi', [])
+    return ForecastSeries(_timestamps(temperature, 'date'), {
+        "temperature_max": _column(temperature, n, 'max'),
+        "temperature_min": _column(temperature, n, 'min'),
+        "temperature_avg": _column(temperature, n, 'avg'),
+        "precipitation_avg": _column(precipitation, n, 'avg'),
+        "precipitation_probability": _column(precipitation, n, 'probability'),
+        "wind_speed_max": _column(wind, n, 'max', 'speed'),
+        "wind_speed_avg": _column(wind, n, 'avg', 'speed'),
+        "aqi_max": _column(aqi, n, 'max', 'chn'),
+        "aqi_avg": _column(aqi, n, 'avg', 'chn'),
+        "skycon": _text_column(daily.get('skycon', []), n),
+    })
+
+
+_PARSERS = {
+    "hourly": (parse_hourly, FORECAST_HOURLY_STEPS),
+    "daily": (parse_daily, FORECAST_DAILY_STEPS),
+}
+
+
+class ForecastStore:
+    """
+    各地点预报的内存存储
+    原始数据来自带缓存的彩云天气接口，只有上游数据更新时才重新解析
+    """
+
+    def __init__(self, locations=LOCATIONS):
+        self.locations = locations
+        self._raw = {}     # (地点id, 类型) -> 解析时使用的原始数据
+        self._series = {}  # (地点id, 类型) -> ForecastSeries
+
+    async def get(self, location_id="default", kind="hourly"):
+        """返回某地点的预报序列，失败时返回上一次成功解析的结果（可能为 None）"""
+        parser, steps = _PARSERS[kind]
+        location = self.locations[location_id]
+        key = (location_id, kind)
+        raw = await fetch_forecast(location["longitude"], location["latitude"], kind, steps)
+        if raw is not None and raw is not self._raw.get(key):
+            series = parser(raw)
+            if series is not None:
+                self._raw[key] = raw
+                self._series[key] = series
+        return self._series.get(key)
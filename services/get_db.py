@@ -1,32 +1,386 @@
 import sqlite3
+import threading
+import time
+from datetime import datetime
 
+from services.metrics import track
+from services.config import (
+    DB_PATH, DB_BUSY_TIMEOUT, RAW_RETENTION_DAYS, TIER_RETENTION_DAYS, MONITOR_HEALTH_INTERVAL,
+)
 
-def get_recent_readings(limit = None):
+# 本地时区相对UTC的偏移（毫秒），使小时/天的时间桶按本地时间对齐（不考虑夏令时）
+LOCAL_OFFSET_MS = int(datetime.now().astimezone().utcoffset().total_seconds() * 1000)
+
+# 查询语句固定不变，同一连接上的语句由 sqlite3 自动缓存复用（预编译）
+# ts 为毫秒时间戳；timestamp 为兼容旧接口的本地时间 ISO-8601 字符串
+READING_COLUMNS = """strftime('%Y-%m-%dT%H:%M:%f', ts / 1000.0, 'unixepoch', 'localtime') AS timestamp,
+       ts, device_mac, temperature, humidity, battery"""
+
+SELECT_RECENT = f'''
+SELECT {READING_COLUMNS} FROM sensor_readings 
+ORDER BY ts DESC 
+LIMIT ?
+'''
+
+SELECT_RECENT_BY_DEVICE = f'''
+SELECT {READING_COLUMNS} FROM sensor_readings 
+WHERE device_mac = ?
+ORDER BY ts DESC 
+LIMIT ?
+'''
+
+# sensor_latest 每台设备一行，与每次写入在同一事务中更新
+SELECT_LATEST = f'''
+SELECT {READING_COLUMNS} FROM sensor_latest 
+ORDER BY ts DESC 
+LIMIT 1
+'''
+
+SELECT_LATEST_BY_DEVICE = f'''
+SELECT {READING_COLUMNS} FROM sensor_latest 
+WHERE device_mac = ?
+'''
+
+# 降采样层级：(名称, 桶长度毫秒)，从细到粗；每层表名为 sensor_readings_<名称>
+TIERS = [
+    ("1m", 60 * 1000),
+    ("1h", 3600 * 1000),
+    ("1d", 86400 * 1000),
+]
+
+# 数据库结构版本（PRAGMA user_version）
+# 0: timestamp 为 ISO-8601 文本；1: ts 为毫秒时间戳 + sensor_latest
+SCHEMA_VERSION = 1
+
+# ISO-8601 本地时间文本 -> 毫秒时间戳（仅用于迁移旧数据）
+_TEXT_TO_MS = "CAST(ROUND((julianday({0}, 'utc') - 2440587.5) * 86400000) AS INTEGER)"
+
+
+def bucket_sql(column, size):
+    """把毫秒时间戳列映射到所在时间桶起点（按本地时间对齐）的 SQL 表达式"""
+    return f"(({column} + {LOCAL_OFFSET_MS}) / {size}) * {size} - {LOCAL_OFFSET_MS}"
+
+def to_epoch_ms(value = None):
+    """
+    把 毫秒时间戳 / datetime / ISO-8601 字符串（无时区时按本地时间）转换为毫秒时间戳，
+    None 表示当前时间
+    """
+    if value is None:
+        return int(time.time() * 1000)
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        if value.isdigit():
+            return int(value)
+        value = datetime.fromisoformat(value)
+    return int(value.timestamp() * 1000)
+
+_local = threading.local()
+
+
+def dict_factory(cursor, row):
+    """把查询结果行转换为字典"""
+    return dict(zip([column[0] for column in cursor.description], row))
+
+def get_connection(db_path = DB_PATH):
+    """
+    返回当前线程复用的数据库连接
+    首次创建时开启 WAL 模式（读写互不阻塞）并设置忙等待超时
+    """
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(db_path)
+    if conn is None:
+        conn = sqlite3.connect(db_path, timeout=DB_BUSY_TIMEOUT / 1000)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA busy_timeout={int(DB_BUSY_TIMEOUT)}")
+        conn.execute("PRAGMA synchronous=NORMAL")  # WAL 模式下可安全使用，减少 fsync
+        conn.row_factory = dict_factory
+        connections[db_path] = conn
+    return conn
+
+def close_connections():
+    """关闭当前线程持有的所有连接"""
+    connections = getattr(_local, "connections", {})
+    for conn in connections.values():
+        conn.close()
+    connections.clear()
+
+
+def _create_tables(conn):
+    """创建当前版本的全部表与索引（已存在的跳过）"""
+    # 创建传感器数据表（ts 为毫秒时间戳）
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS sensor_readings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ts INTEGER NOT NULL,
+        device_mac TEXT NOT NULL,
+        temperature REAL,
+        humidity REAL,
+        battery INTEGER
+    )
+    ''')
+
+    # 按时间范围查询与汇总
+    conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_ts ON sensor_readings(ts)
+    ''')
+
+    # 覆盖索引：按设备取最近N条时无需回表
+    conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_device_ts 
+    ON sensor_readings(device_mac, ts DESC, temperature, humidity, battery)
+    ''')
+
+    # 每台设备的最新读数
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS sensor_latest (
+        device_mac TEXT PRIMARY KEY,
+        ts INTEGER NOT NULL,
+        temperature REAL,
+        humidity REAL,
+        battery INTEGER
+    ) WITHOUT ROWID
+    ''')
+
+    # 降采样汇总表：每个设备每个时间桶一行，bucket 为时间桶起点（毫秒）
+    for name, _ in TIERS:
+        conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS sensor_readings_{name} (
+            device_mac TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            temp_min REAL,
+            temp_max REAL,
+            temp_avg REAL,
+            hum_min REAL,
+            hum_max REAL,
+            hum_avg REAL,
+            battery INTEGER,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (device_mac, bucket)
+        ) WITHOUT ROWID
+        ''')
+        conn.execute(f'''
+        CREATE INDEX IF NOT EXISTS idx_{name}_bucket ON sensor_readings_{name}(bucket)
+        ''')
+
+    # 实时监控的连接状态，供网页服务查看（每台设备一行）
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS sensor_health (
+        device_mac TEXT PRIMARY KEY,
+        connected INTEGER NOT NULL,
+        last_packet INTEGER,
+        reconnects INTEGER NOT NULL,
+        last_error TEXT,
+        updated INTEGER NOT NULL
+    ) WITHOUT ROWID
+    ''')
+
+    # 各层已汇总到的位置（不含，毫秒），之前的时间桶已完整
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS compaction_state (
+        tier TEXT PRIMARY KEY,
+        watermark INTEGER NOT NULL
+    )
+    ''')
+
+def _migrate_to_epoch_ms(conn, tables):
+    """
+    把 ISO-8601 文本时间的旧表迁移为毫秒时间戳（在调用方的事务中执行）
+    旧版本迁移中断留下的 *_legacy 表会被继续迁移：丢弃未完成的新表后从 *_legacy 重新复制
+    """
+    print("正在迁移数据库结构（时间改为毫秒时间戳）...")
+    legacy = []
+    for name in ["sensor_readings", "compaction_state"] + [f"sensor_readings_{n}" for n, _ in TIERS]:
+        if f"{name}_legacy" in tables:
+            if name in tables:
+                conn.execute(f'DROP TABLE {name}')
+        elif name in tables:
+            conn.execute(f'ALTER TABLE {name} RENAME TO {name}_legacy')
+        else:
+            continue
+        legacy.append(name)
+    conn.execute('DROP INDEX IF EXISTS idx_timestamp')
+    for name, _ in TIERS:
+        conn.execute(f'DROP INDEX IF EXISTS idx_{name}_bucket')
+    
+    _create_tables(conn)
+    conn.execute(f'''
+    INSERT INTO sensor_readings (id, ts, device_mac, temperature, humidity, battery)
+    SELECT id, {_TEXT_TO_MS.format('timestamp')}, device_mac, temperature, humidity, battery
+    FROM sensor_readings_legacy
+    ''')
+    for name, _ in TIERS:
+        if f"sensor_readings_{name}" in legacy:
+            conn.execute(f'''
+            INSERT INTO sensor_readings_{name}
+            SELECT device_mac, {_TEXT_TO_MS.format('bucket')}, temp_min, temp_max, temp_avg,
+                   hum_min, hum_max, hum_avg, battery, count
+            FROM sensor_readings_{name}_legacy
+            ''')
+    if "compaction_state" in legacy:
+        conn.execute(f'''
+        INSERT INTO compaction_state (tier, watermark)
+        SELECT tier, {_TEXT_TO_MS.format('watermark')} FROM compaction_state_legacy WHERE watermark != ''
+        ''')
+    # 取每台设备时间最新的一行（SQLite 中 MAX() 聚合时其余列取自该行）
+    conn.execute('''
+    INSERT OR REPLACE INTO sensor_latest (device_mac, ts, temperature, humidity, battery)
+    SELECT device_mac, MAX(ts), temperature, humidity, battery
+    FROM sensor_readings GROUP BY device_mac
+    ''')
+    for name in legacy:
+        conn.execute(f'DROP TABLE {name}_legacy')
+    print("✓ 数据库迁移完成")
+
+def init_schema(db_path = DB_PATH):
+    """
+    创建表结构，旧版（ISO-8601 文本时间）数据库迁移为毫秒时间戳
+    蓝牙采集进程与网页服务启动时都会调用
+    sqlite3 模块默认在 DDL 前不开启事务，这里用独立连接显式 BEGIN/COMMIT，迁移中途失败时整体回滚
+    """
+    conn = sqlite3.connect(db_path, timeout=DB_BUSY_TIMEOUT / 1000, isolation_level=None)
+    conn.row_factory = dict_factory
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        # IMMEDIATE：两个进程同时启动时只有一个执行迁移，另一个等待后看到新版本
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute('PRAGMA user_version').fetchone()['user_version']
+            tables = {row['name'] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            if version < SCHEMA_VERSION and tables & {"sensor_readings", "sensor_readings_legacy"}:
+                _migrate_to_epoch_ms(conn, tables)
+            else:
+                _create_tables(conn)
+            conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+
+
+def get_recent_readings(limit = None, device_mac = None):
     if limit is None:
         limit = 3
         
-    conn = sqlite3.connect("sensor_data.db")
-    conn.row_factory = sqlite3.Row  # 使返回结果为字典形式
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-    SELECT * FROM sensor_readings 
-    ORDER BY timestamp DESC 
-    LIMIT ?
-    ''', (limit,))
-    
-    rows = cursor.fetchall()
-    conn.close()
-    
-    # 转换为字典列表
-    result = []
+    conn = get_connection()
+    with track("sqlite", "recent_readings"):
+        # 只取最新一条时直接读 sensor_latest，与历史数据量无关
+        if limit == 1:
+            if device_mac is None:
+                return conn.execute(SELECT_LATEST).fetchall()
+            return conn.execute(SELECT_LATEST_BY_DEVICE, (device_mac,)).fetchall()
+        if device_mac is None:
+            return conn.execute(SELECT_RECENT, (limit,)).fetchall()
+        return conn.execute(SELECT_RECENT_BY_DEVICE, (device_mac, limit)).fetchall()
+
+
+def _covers(retention_days, start, now):
+    return retention_days is None or start >= now - retention_days * 86400 * 1000
+
+def choose_tier(start, end, max_points = 500, now = None):
+    """
+    选择能回答查询的最粗层级：桶长度不超过 (end-start)/max_points 且保留期覆盖 start；
+    start/end 为毫秒时间戳，返回层级名称，"raw" 表示原始表
+    """
+    now = now or to_epoch_ms()
+    resolution = (end - start) / max_points
+    covering = [(name, size) for name, size in reversed(TIERS)
+                if _covers(TIER_RETENTION_DAYS.get(name), start, now)]
+    if _covers(RAW_RETENTION_DAYS, start, now):
+        covering.append(("raw", 0))
+    for name, size in covering:
+        if size <= resolution:
+            return name
+    # 保留期内没有足够细的层级时，退而使用覆盖 start 的最细层级
+    return covering[-1][0] if covering else TIERS[-1][0]
+
+def get_history(start, end = None, device_mac = None, max_points = 500, db_path = DB_PATH):
+    """
+    查询 [start, end) 时间范围内的温湿度历史
+    start/end: 毫秒时间戳或 ISO-8601 字符串，end 为 None 表示当前时间
+    自动选择层级；汇总层尚未覆盖的最新部分直接从原始表按同样的时间桶聚合
+    返回 {"tier": 层级名称, "points": [...]}，每个点的 ts 为毫秒时间戳（时间桶起点）
+    """
+    start, end = to_epoch_ms(start), to_epoch_ms(end)
+    tier = choose_tier(start, end, max_points)
+    with track("sqlite", "history"):
+        return _query_history(get_connection(db_path), tier, start, end, device_mac)
+
+def _query_history(conn, tier, start, end, device_mac):
+    device_filter = "" if device_mac is None else "AND device_mac = ?"
+    device_args = () if device_mac is None else (device_mac,)
+
+    if tier == "raw":
+        rows = conn.execute(f'''
+        SELECT ts, temperature, temperature AS temperature_min, temperature AS temperature_max,
+               humidity, humidity AS humidity_min, humidity AS humidity_max, 1 AS count
+        FROM sensor_readings
+        WHERE ts >= ? AND ts < ? {device_filter}
+        ORDER BY ts
+        ''', (start, end) + device_args).fetchall()
+        return {"tier": tier, "points": rows}
+
+    size = dict(TIERS)[tier]
+    row = conn.execute("SELECT watermark FROM compaction_state WHERE tier = ?", (tier,)).fetchone()
+    watermark = row["watermark"] if row else 0
+    split = max(min(end, watermark), start)
+    # 聚合多台设备时按桶合并，加权平均
+    rows = conn.execute(f'''
+    SELECT bucket AS ts,
+           SUM(temp_avg * count) / SUM(count) AS temperature, MIN(temp_min) AS temperature_min,
+           MAX(temp_max) AS temperature_max,
+           SUM(hum_avg * count) / SUM(count) AS humidity, MIN(hum_min) AS humidity_min,
+           MAX(hum_max) AS humidity_max, SUM(count) AS count
+    FROM sensor_readings_{tier}
+    WHERE bucket >= {bucket_sql("?", size)} AND bucket < ? {device_filter}
+    GROUP BY bucket
+    UNION ALL
+    SELECT {bucket_sql("ts", size)} AS bucket_ts,
+           AVG(temperature), MIN(temperature), MAX(temperature),
+           AVG(humidity), MIN(humidity), MAX(humidity), COUNT(*)
+    FROM sensor_readings
+    WHERE ts >= ? AND ts < ? {device_filter}
+    GROUP BY bucket_ts
+    ORDER BY ts
+    ''', (start, split) + device_args + (split, end) + device_args).fetchall()
+    return {"tier": tier, "points": rows}
+
+
+def get_device_health(device_mac = None, db_path = DB_PATH):
+    """
+    读取实时监控写入的连接状态
+    last_packet_age 为距最后一次收到通知的秒数；
+    采集进程超过 3 个上报间隔未更新时 alive 为 False，此时 connected 也视为 False
+    """
+    conn = get_connection(db_path)
+    try:
+        if device_mac is None:
+            rows = conn.execute("SELECT * FROM sensor_health ORDER BY device_mac").fetchall()
+        else:
+            rows = conn.execute("SELECT * FROM sensor_health WHERE device_mac = ?", (device_mac,)).fetchall()
+    except sqlite3.OperationalError:
+        return []  # 采集端尚未建表
+    now = to_epoch_ms()
     for row in rows:
-        row_dict = dict(row)
-        result.append(row_dict)
-    
-    return result
+        row["alive"] = now - row["updated"] < 3 * MONITOR_HEALTH_INTERVAL * 1000
+        row["connected"] = bool(row["connected"]) and row["alive"]
+        row["last_packet_age"] = None if row["last_packet"] is None else round((now - row["last_packet"]) / 1000, 1)
+    return rows
+
+def get_sensor_ages(db_path = DB_PATH):
+    """各设备最新读数距今的秒数 {设备MAC: 秒}，供 /metrics 使用"""
+    try:
+        rows = get_connection(db_path).execute("SELECT device_mac, ts FROM sensor_latest").fetchall()
+    except sqlite3.OperationalError:
+        return {}  # 采集端尚未建表
+    now = to_epoch_ms()
+    return {row["device_mac"]: (now - row["ts"]) / 1000 for row in rows}
 
 
 if __name__ == "__main__":
     temp = get_recent_readings(1)
-    print(f"今日气温{temp[0]['temperature']}, 湿度{temp[0]['humidity']}")
\ No newline at end of file
+    print(f"今日气温{temp[0]['temperature']}, 湿度{temp[0]['humidity']}")
@@ -1,37 +1,355 @@
-import cv2, threading, time
+import cv2, os, tempfile, threading, time
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+
+try:
+    import fcntl
+except ImportError:  # Windows：不支持多 worker 共享，每个进程各自读取摄像头
+    fcntl = None
+
+from services.metrics import CACHE_REQUESTS
+from services.config import (
+    CAMERA_RTSP, CAMERA_INTERVAL, CAMERA_MODE, CAMERA_MAX_AGE, CAMERA_SHM_NAME, CAMERA_SHM_SLOTS,
+)
+
+
+class FrameRing:
+    """
+    共享内存中的帧环形缓冲区，其他进程可零拷贝读取最新帧
+    布局：int64 头部 [槽数, 高, 宽, 通道, 最新序号, 请求计数, 已关闭, 各槽序号..., 各槽时间戳(毫秒)...]，
+    随后是各槽的 BGR 数据。
+    写入方在 next_slot() 中先把该槽序号置为 -1（无效），写完数据后由 commit() 发布新序号；
+    读取方拿到的是视图，复制完后用 is_current() 确认该槽在复制期间未被改写（否则可能是半新半旧的帧）。
+    读取方可用 request() 请求写入方尽快解码新帧；写入方关闭（如分辨率变化后重建）时置位 closed，
+    读取方应重新 attach()
+    """
+    _HEADER = 7
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        slots, h, w, c = (int(v) for v in np.ndarray((4,), dtype=np.int64, buffer=shm.buf))
+        self.slots = slots
+        self.shape = (h, w, c)
+        self._header = np.ndarray((self._HEADER + 2 * slots,), dtype=np.int64, buffer=shm.buf)
+        self._seqs = self._header[self._HEADER:self._HEADER + slots]
+        self._times = self._header[self._HEADER + slots:]
+        offset = self._header_size(slots)
+        self._frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=shm.buf, offset=offset)
+
+    @classmethod
+    def _header_size(cls, slots):
+        return (8 * (cls._HEADER + 2 * slots) + 63) // 64 * 64
+
+    @classmethod
+    def create(cls, name, shape, slots=CAMERA_SHM_SLOTS):
+        """创建缓冲区（同一名称只应有一个写入方，见 open_camera）"""
+        size = cls._header_size(slots) + slots * int(np.prod(shape))
+        try:
+            # 上次异常退出可能遗留同名内存
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        header = np.ndarray((cls._HEADER + 2 * slots,), dtype=np.int64, buffer=shm.buf)
+        header[:] = 0
+        header[:4] = (slots,) + tuple(shape)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name=CAMERA_SHM_NAME):
+        """在其他进程中打开已存在的缓冲区（只读使用，不负责释放）"""
+        shm = shared_memory.SharedMemory(name=name)
+        # 非创建方退出时不应删除共享内存
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return cls(shm, owner=False)
+
+    def next_slot(self):
+        """下一个写入位置的视图，可直接作为解码目标；该槽原来的帧立即失效"""
+        i = (int(self._header[4]) + 1) % self.slots
+        self._seqs[i] = -1
+        return self._frames[i]
+
+    def commit(self, timestamp_ms):
+        """把 next_slot() 中已写好的帧发布为最新帧，返回其序号"""
+        seq = int(self._header[4]) + 1
+        i = seq % self.slots
+        self._times[i] = timestamp_ms
+        self._seqs[i] = seq
+        self._header[4] = seq
+        return seq
+
+    def latest(self):
+        """返回 (帧视图, 序号, 时间戳毫秒)，尚无帧时返回 (None, 0, 0)"""
+        seq = int(self._header[4])
+        if seq == 0:
+            return None, 0, 0
+        i = seq % self.slots
+        return self._frames[i], seq, int(self._times[i])
+
+    def is_current(self, seq):
+        """序号为 seq 的帧是否仍未被覆盖"""
+        return int(self._seqs[seq % self.slots]) == seq
+
+    def request(self):
+        """读取方请求写入方尽快解码新帧"""
+        self._header[5] += 1
+
+    @property
+    def requests(self):
+        return int(self._header[5])
+
+    @property
+    def closed(self):
+        return bool(self._header[6])
+
+    def close(self):
+        if self.owner:
+            self._header[6] = 1  # 通知读取方重新打开
+        # 释放视图后才能关闭共享内存；仍有外部视图时保持映射（进程退出时释放），避免悬空指针
+        self._header = self._seqs = self._times = self._frames = None
+        try:
+            self.shm.close()
+        except BufferError:
+            pass
+        if self.owner:
+            self.shm.unlink()
 
-from services.config import CAMERA_RTSP, CAMERA_INTERVAL
 
 class CameraGrabber:
-    """后台线程：不断读 RTSP，把最新帧保存在内存"""
-    def __init__(self):
+    """
+    后台线程：不断读 RTSP（或本地视频文件），把最新帧保存在内存
+    每帧按画质只编码一次 JPEG，所有请求共享同一份字节
+
+    mode="interval"：每隔 interval 秒读取并解码一帧，其余时间不读流
+    mode="drain"：持续 grab() 清空流缓冲，只在有请求或到达 interval 时 retrieve()
+                  （颜色转换并输出 BGR 帧），保证取到的是最新画面而不是缓冲中的旧帧；
+                  设置 shm_name 时每个新帧另外复制一份到共享内存环形缓冲区
+    """
+    def __init__(self, source=CAMERA_RTSP, interval=CAMERA_INTERVAL, mode=CAMERA_MODE,
+                 max_age=CAMERA_MAX_AGE, shm_name=CAMERA_SHM_NAME):
+        self.source = source
+        self.interval = interval
+        self.mode = mode
+        self.max_age = max_age
+        self.shm_name = shm_name
+        self.ring = None
+        self.lock_file = None           # open_camera() 选出的写入方持有的文件锁
         self.frame = None
-        self.lock = threading.Lock()
+        self.frame_id = 0               # 每读到新帧加一
+        self.frame_time = 0.0           # 最新帧的解码时间（time.monotonic()）
+        self.lock = threading.Lock()    # 保护 frame/frame_id/_jpeg，只短暂持有
+        self._new_frame = threading.Condition(self.lock)
+        self._encode_lock = threading.Lock()
+        self._jpeg = {}                 # 画质 -> 当前帧的 JPEG 字节
+        self._want = threading.Event()  # 有请求需要新帧
+        self._stop = threading.Event()
         self.t = threading.Thread(target=self._grab, daemon=True)
         self.t.start()
 
+    def _open(self):
+        cap = cv2.VideoCapture(self.source)
+        # 本地视频文件读到结尾后从头循环，便于离线测试
+        self._is_file = cap.isOpened() and cap.get(cv2.CAP_PROP_FRAME_COUNT) > 0
+        self._file_delay = 1 / (cap.get(cv2.CAP_PROP_FPS) or 25) if self._is_file else 0
+        return cap
+
+    def _publish(self, frame):
+        with self.lock:
+            self.frame = frame
+            self.frame_id += 1
+            self.frame_time = time.monotonic()
+            self._jpeg = {}
+            self._new_frame.notify_all()
+
+    def _decode(self, cap):
+        """
+        解码 grab() 得到的帧；有共享内存时再复制一份到环形缓冲区供其他进程读取。
+        进程内使用的 self.frame 是独立的数组，环形缓冲区回绕覆盖槽位时
+        正在编码 JPEG 或做运动检测的读取方不会读到被改写一半的画面
+        """
+        ret, frame = cap.retrieve()
+        if not ret:
+            return None
+        if self.shm_name:
+            if self.ring is None or frame.shape != self.ring.shape:
+                # 首帧或分辨率变化：按该尺寸重建缓冲区
+                if self.ring is not None:
+                    self.ring.close()
+                self.ring = FrameRing.create(self.shm_name, frame.shape)
+            self.ring.next_slot()[:] = frame
+            self.ring.commit(int(time.time() * 1000))
+        return frame
+
     def _grab(self):
-        cap = cv2.VideoCapture(CAMERA_RTSP)
-        while True:
-            ret, frame = cap.read()
-            if ret:
-                with self.lock:
-                    self.frame = frame
-            else:                       # 断线重连
+        cap = self._open()
+        next_decode = 0.0
+        ring_requests = 0
+        while not self._stop.is_set():
+            ret = cap.grab()
+            if not ret and self._is_file:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ret = cap.grab()
+            if not ret:                 # 断线重连
                 cap.release()
-                time.sleep(2)
-                cap = cv2.VideoCapture(CAMERA_RTSP)
-            time.sleep(CAMERA_INTERVAL)
+                self._stop.wait(2)
+                cap = self._open()
+                continue
+
+            if self.mode == "drain":
+                now = time.monotonic()
+                # 其他 worker 通过共享内存发来的请求
+                requested = self.ring is not None and self.ring.requests != ring_requests
+                if requested:
+                    ring_requests = self.ring.requests
+                if requested or self._want.is_set() or now >= next_decode:
+                    self._want.clear()
+                    frame = self._decode(cap)
+                    if frame is not None:
+                        self._publish(frame)
+                        next_decode = now + self.interval
+                if self._is_file:
+                    self._stop.wait(self._file_delay)  # 文件按原始帧率读取，模拟实时流
+            else:
+                frame = self._decode(cap)
+                if frame is not None:
+                    self._publish(frame)
+                self._stop.wait(self.interval)
+        cap.release()
+        if self.ring is not None:
+            with self.lock:
+                self.frame = None
+            self.ring.close()
+
+    def stop(self):
+        self._stop.set()
+        self.t.join(timeout=5)
+        if self.lock_file is not None:
+            self.lock_file.close()
+            self.lock_file = None
+
+    def request(self):
+        """请求尽快解码一帧新画面（drain 模式），不等待"""
+        self._want.set()
+
+    def _fresh(self, timeout=2.0):
+        """drain 模式下最新帧超过 max_age 秒时请求新帧并等待，超时则使用旧帧"""
+        if self.mode != "drain":
+            return
+        with self.lock:
+            if self.frame is not None and time.monotonic() - self.frame_time <= self.max_age:
+                return
+            frame_id = self.frame_id
+            self._want.set()
+            self._new_frame.wait_for(lambda: self.frame_id != frame_id or self._stop.is_set(), timeout)
+
+    def get_frame(self, quality=85):
+        """返回 (JPEG 二进制, 帧序号)，尚无画面时返回 (None, 0)"""
+        self._fresh()
+        with self.lock:
+            frame, frame_id = self.frame, self.frame_id
+            cached = self._jpeg.get(quality)
+        if frame is None:
+            return None, 0
+        if cached is not None:
+            CACHE_REQUESTS.inc("camera_jpeg", "hit")
+            return cached, frame_id
+        CACHE_REQUESTS.inc("camera_jpeg", "miss")
+        # 编码在帧锁之外进行，不阻塞采集线程；同时请求的多个客户端只编码一次
+        with self._encode_lock:
+            with self.lock:
+                cached = self._jpeg.get(quality) if self.frame_id == frame_id else None
+            if cached is not None:
+                return cached, frame_id
+            _, enc = cv2.imencode('.jpg', frame,
+                                  [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+            data = enc.tobytes()
+            with self.lock:
+                if self.frame_id == frame_id:
+                    self._jpeg[quality] = data
+            return data, frame_id
 
     def get_frame_bytes(self, quality=85):
         """返回 JPEG 二进制，可直接给 FastAPI 的 Response"""
-        with self.lock:
-            if self.frame is None:
-                return None
-            _, enc = cv2.imencode('.jpg', self.frame,
-                                 [int(cv2.IMWRITE_JPEG_QUALITY), quality])
-            return enc.tobytes()
+        return self.get_frame(quality)[0]
+
+
+class SharedCamera(CameraGrabber):
+    """
+    其他 worker 进程中的摄像头：不连接 RTSP，从写入方的共享内存环形缓冲区读取新帧，
+    复制一份后按 CameraGrabber 的方式发布（JPEG 缓存、request()、get_frame() 用法相同）。
+    写入方尚未启动或重建缓冲区时自动重新打开
+    """
+    def __init__(self, shm_name=CAMERA_SHM_NAME, mode=CAMERA_MODE, max_age=CAMERA_MAX_AGE, poll_interval=0.05):
+        self.poll_interval = poll_interval
+        super().__init__(source=None, mode=mode, max_age=max_age, shm_name=shm_name)
+
+    def _grab(self):
+        ring = None
+        seen = 0
+        asked = None  # 最早一次未得到回应的请求时间
+        while not self._stop.wait(self.poll_interval):
+            if ring is None or ring.closed:
+                if ring is not None:
+                    ring.close()
+                try:
+                    ring = FrameRing.attach(self.shm_name)
+                except FileNotFoundError:
+                    ring = None
+                    continue
+                seen = 0
+            if self._want.is_set():
+                self._want.clear()
+                ring.request()
+                asked = asked or time.monotonic()
+            view, seq, _ = ring.latest()
+            if view is not None and seq != seen:
+                frame = view.copy()
+                # 复制期间被写入方覆盖则丢弃，下一轮重新读取
+                if ring.is_current(seq):
+                    seen = seq
+                    asked = None
+                    self._publish(frame)
+                continue
+            # 写入方异常退出后重建的缓冲区不会置位 closed：请求长时间无回应时重新打开
+            if asked is not None and time.monotonic() - asked > 5:
+                ring.close()
+                ring = None
+                asked = None
+        if ring is not None:
+            ring.close()
+
+
+def open_camera(source=CAMERA_RTSP, shm_name=CAMERA_SHM_NAME):
+    """
+    多个 worker 共用一路摄像头：用文件锁选出一个进程连接 RTSP 并写入共享内存，
+    其余进程返回 SharedCamera 从共享内存读取。未启用共享内存时每个进程各自读取
+    """
+    if not shm_name or fcntl is None:
+        return CameraGrabber(source, shm_name=None)
+    lock_file = open(os.path.join(tempfile.gettempdir(), f"{shm_name}.lock"), "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return SharedCamera(shm_name)
+    camera = CameraGrabber(source, shm_name=shm_name)
+    camera.lock_file = lock_file  # 进程存活期间持有，退出（含崩溃）时由系统释放
+    return camera
 
 
 if __name__ == "__main__":
-    camera = CameraGrabber()
\ No newline at end of file
+    # python -m services.get_rtsp [视频文件或RTSP地址]：保存一帧到 frame.jpg
+    import sys
+    camera = CameraGrabber(sys.argv[1] if len(sys.argv) > 1 else CAMERA_RTSP)
+    while camera.get_frame_bytes() is None:
+        time.sleep(0.1)
+    start = time.perf_counter()
+    for _ in range(100):
+        data = camera.get_frame_bytes()
+    print(f"100 次取帧耗时 {(time.perf_counter() - start) * 1000:.1f} ms（只编码一次）")
+    with open("frame.jpg", "wb") as f:
+        f.write(data)
+    camera.stop()
@@ -0,0 +1,124 @@
+# pip install brotli（可选，未安装时只使用 gzip）
+
+import gzip
+import hashlib
+import os
+
+from fastapi import Request, Response
+
+from services.config import COMPRESS_MIN_SIZE
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def choose_encoding(accept_encoding):
+    """根据 Accept-Encoding 选择压缩方式，优先 br，其次 gzip，都不接受返回 None"""
+    weights = {}  # 编码 -> q 值
+    for item in (accept_encoding or "").split(","):
+        name, *params = item.split(";")
+        q = 1.0
+        for param in params:
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name.strip().lower()] = q
+
+    def acceptable(coding):
+        # 明确列出的编码（包括 q=0 拒绝）优先于 * 通配
+        return weights.get(coding, weights.get("*", 0.0)) > 0
+
+    if brotli is not None and acceptable("br"):
+        return "br"
+    if acceptable("gzip"):
+        return "gzip"
+    return None
+
+def etag_matches(request: Request, etag):
+    """If-None-Match 是否与 etag 匹配（弱比较）"""
+    header = request.headers.get("if-none-match")
+    if not header or not etag:
+        return False
+    if header.strip() == "*":
+        return True
+    target = etag[2:] if etag.startswith("W/") else etag
+    for tag in header.split(","):
+        tag = tag.strip()
+        if (tag[2:] if tag.startswith("W/") else tag) == target:
+            return True
+    return False
+
+
+class Representation:
+    """一份响应内容及其 ETag；各压缩版本在首次需要时生成一次，之后复用"""
+
+    def __init__(self, body, etag, media_type):
+        self.etag = etag
+        self.media_type = media_type
+        self._encoded = {None: body}
+
+    def etag_for(self, encoding=None):
+        """某个压缩版本的 ETag：强 ETag 按编码加后缀（不同字节内容不能共用强 ETag），弱 ETag 各版本共用"""
+        if not self.etag or not encoding or self.etag.startswith("W/"):
+            return self.etag
+        return f'{self.etag[:-1]}-{encoding}"'
+
+    def body(self, encoding=None):
+        encoded = self._encoded.get(encoding)
+        if encoded is None:
+            raw = self._encoded[None]
+            if encoding == "br":
+                encoded = brotli.compress(raw, quality=5)
+            else:
+                encoded = gzip.compress(raw, compresslevel=6, mtime=0)
+            self._encoded[encoding] = encoded
+        return encoded
+
+
+def not_modified(etag, cache_control):
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control,
+                                              "Vary": "Accept-Encoding"})
+
+def respond(request: Request, representation, cache_control):
+    """条件请求命中时返回 304，否则按客户端支持的方式压缩后返回"""
+    encoding = None
+    if len(representation.body()) >= COMPRESS_MIN_SIZE:
+        encoding = choose_encoding(request.headers.get("accept-encoding"))
+    etag = representation.etag_for(encoding)
+    if etag_matches(request, etag):
+        return not_modified(etag, cache_control)
+    headers = {"Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if etag:
+        headers["ETag"] = etag
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(representation.body(encoding), media_type=representation.media_type, headers=headers)
+
+
+class StaticFile:
+    """
+    静态文件：内容与 ETag（内容哈希）缓存在内存中，
+    文件修改时间或大小变化后才重新读取
+    """
+
+    def __init__(self, path, media_type):
+        self.path = path
+        self.media_type = media_type
+        self._stat = None
+        self._representation = None
+
+    def get(self):
+        stat = os.stat(self.path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        if key != self._stat:
+            with open(self.path, 'rb') as f:
+                body = f.read()
+            etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+            self._representation = Representation(body, etag, self.media_type)
+            self._stat = key
+        return self._representation
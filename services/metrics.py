@@ -0,0 +1,220 @@
+import bisect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Prometheus 文本格式（0.0.4）
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 秒，覆盖本地 SQLite（毫秒级）到彩云天气/AI/蓝牙（秒级）
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_registry = []  # 按注册顺序输出
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """
+    指标基类：按标签值元组分别计数
+    热路径只做一次字典查找和加法（持锁几十纳秒），格式化全部在抓取时进行
+    """
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def samples(self):
+        """返回 [(后缀, 标签字符串, 值)]"""
+        with self._lock:
+            items = list(self._values.items())
+        return [("", _format_labels(self.labels, key), value) for key, value in sorted(items)]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """只增不减的计数器；标签值按 labels 的顺序作为位置参数传入"""
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    """
+    可增可减的数值；也可用 set_function 在抓取时计算
+    （函数返回 {标签值元组: 数值}，适合从数据库或其他对象读取的状态）
+    """
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__(name, documentation, labels)
+        self._function = None
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def set_function(self, function):
+        self._function = function
+
+    def samples(self):
+        if self._function is None:
+            return super().samples()
+        try:
+            values = self._function()
+        except Exception as e:
+            print(f"采集指标 {self.name} 失败: {e}")
+            return []
+        return [("", _format_labels(self.labels, key), value)
+                for key, value in sorted(values.items()) if value is not None]
+
+
+class Histogram(_Metric):
+    """分桶直方图：记录时只给所在桶加一，输出时再累加成 Prometheus 要求的累计值"""
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][i] += 1
+            entry[1] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        samples = []
+        for key, counts, total in sorted(items):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                samples.append(("_bucket", _format_labels(self.labels, key, f'le="{_format_value(float(bound))}"'),
+                                cumulative))
+            samples.append(("_sum", _format_labels(self.labels, key), total))
+            samples.append(("_count", _format_labels(self.labels, key), cumulative))
+        return samples
+
+
+def render():
+    """所有已注册指标的文本格式"""
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+
+# 上游依赖：upstream 为 caiyun / llm / sqlite / ble，operation 为具体调用
+UPSTREAM_SECONDS = Histogram("mirror_upstream_request_seconds", "上游调用耗时（秒）", ("upstream", "operation"))
+UPSTREAM_ERRORS = Counter("mirror_upstream_errors_total", "上游调用失败次数", ("upstream", "operation"))
+# 各级缓存：result 为 hit / miss，另有 stale（过期后仍返回）与 table（命中预计算查找表）
+CACHE_REQUESTS = Counter("mirror_cache_requests_total", "缓存查询次数", ("cache", "result"))
+# HTTP 接口：耗时为收到请求到开始响应（流式接口不含推送时长）
+HTTP_SECONDS = Histogram("mirror_http_request_seconds", "HTTP 请求到响应头的耗时（秒）", ("endpoint", "status"))
+# 温湿度采集：写入结果为 written / dropped / failed（采集进程中记录）
+SENSOR_WRITES = Counter("mirror_sensor_writes_total", "温湿度读数写入条数", ("result",))
+# 以下在抓取时从数据库/刷新器读取（网页服务中记录）
+SENSOR_AGE = Gauge("mirror_sensor_last_reading_age_seconds", "各温湿度计最新读数距今秒数", ("device",))
+SENSOR_CONNECTED = Gauge("mirror_sensor_connected", "实时监控连接状态（1 为已连接）", ("device",))
+SENSOR_PACKET_AGE = Gauge("mirror_sensor_last_packet_age_seconds", "实时监控最后一次收到通知距今秒数", ("device",))
+SNAPSHOT_AGE = Gauge("mirror_snapshot_age_seconds", "各地点 /weather 快照距上次成功刷新的秒数", ("location",))
+
+
+class _Track:
+    __slots__ = ("labels", "start", "failed")
+
+    def __init__(self, labels):
+        self.labels = labels
+        self.failed = False
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def fail(self):
+        """标记本次调用失败（用于不抛异常、只返回 None 的调用）"""
+        self.failed = True
+
+    def __exit__(self, exc_type, exc, tb):
+        UPSTREAM_SECONDS.observe(time.perf_counter() - self.start, *self.labels)
+        if exc_type is not None or self.failed:
+            UPSTREAM_ERRORS.inc(*self.labels)
+        return False
+
+def track(upstream, operation):
+    """
+    记录一次上游调用的耗时，抛出异常或调用 fail() 时计为失败
+        with track("sqlite", "save_readings") as t:
+            ...
+    """
+    return _Track((upstream, operation))
+
+
+class HTTPMetrics:
+    """
+    ASGI 中间件：按路由函数名和状态码记录响应耗时
+    只包装 send 取响应头，不读取请求/响应体，对流式接口无影响
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                endpoint = scope.get("endpoint")
+                HTTP_SECONDS.observe(time.perf_counter() - start,
+                                     getattr(endpoint, "__name__", "unmatched"), str(message["status"]))
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(port, host="127.0.0.1"):
+    """在后台线程中提供 /metrics（供没有网页服务的采集进程使用），默认只监听本机，返回服务器对象"""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,125 @@
+"""
+离线预计算着装建议查找表
+
+python -m services.precompute_advice [--concurrency N] [--output advice_table.json]
+
+遍历 室外×室内 温度网格逐格请求模型，每完成一格追加写入检查点文件（<output>.partial），
+中断后重新运行会跳过已完成的格子；全部完成后写出紧凑的查找表并删除检查点
+"""
+
+import argparse
+import asyncio
+import json
+import os
+
+from services.clothes_suggest import AdviceTable, prompt_signature, request_completion, close_client
+from services.config import (
+    ADVICE_BUCKET_OUT, ADVICE_BUCKET_IN, ADVICE_GRID_OUT, ADVICE_GRID_IN,
+    ADVICE_TABLE_FILE, ADVICE_PRECOMPUTE_CONCURRENCY,
+)
+
+
+def grid_range(bounds, width):
+    """温度范围 -> (最小桶号, 最大桶号)"""
+    return round(bounds[0] / width), round(bounds[1] / width)
+
+def load_checkpoint(path, signature):
+    """读取检查点，返回 {(室外桶号, 室内桶号): 建议}"""
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                item = json.loads(line)
+            except ValueError:
+                continue  # 中断时可能留下不完整的最后一行
+            # 空白建议视为未完成，重新运行时重新请求
+            if item.get("signature") == signature and (item.get("advice") or "").strip():
+                done[(item["out"], item["in"])] = item["advice"]
+    return done
+
+async def precompute(output=ADVICE_TABLE_FILE, concurrency=ADVICE_PRECOMPUTE_CONCURRENCY):
+    signature = prompt_signature()
+    out_range = grid_range(ADVICE_GRID_OUT, ADVICE_BUCKET_OUT)
+    in_range = grid_range(ADVICE_GRID_IN, ADVICE_BUCKET_IN)
+    checkpoint = f"{output}.partial"
+
+    done = load_checkpoint(checkpoint, signature)
+    todo = [
+        (k_out, k_in)
+        for k_out in range(out_range[0], out_range[1] + 1)
+        for k_in in range(in_range[0], in_range[1] + 1)
+        if (k_out, k_in) not in done
+    ]
+    total = len(done) + len(todo)
+    print(f"网格共 {total} 格，已完成 {len(done)} 格，待计算 {len(todo)} 格")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    failed = 0
+
+    async def compute(cell, f):
+        nonlocal failed
+        k_out, k_in = cell
+        tmp_out = round(k_out * ADVICE_BUCKET_OUT, 1)
+        tmp_in = round(k_in * ADVICE_BUCKET_IN, 1)
+        async with semaphore:
+            try:
+                completion = await request_completion(tmp_out, tmp_in)
+            except Exception as e:
+                failed += 1
+                print(f"✗ 室外{tmp_out}℃ 室内{tmp_in}℃ 失败: {e}")
+                return
+        advice = completion.choices[0].message.content
+        # 空白建议不写入（格子保持缺失），计为失败，重新运行时重试
+        if not advice or not advice.strip():
+            failed += 1
+            print(f"✗ 室外{tmp_out}℃ 室内{tmp_in}℃ 失败: 模型返回空白建议")
+            return
+        done[cell] = advice
+        f.write(json.dumps({"signature": signature, "out": k_out, "in": k_in, "advice": advice},
+                           ensure_ascii=False) + "\n")
+        f.flush()
+        print(f"✓ [{len(done)}/{total}] 室外{tmp_out}℃ 室内{tmp_in}℃")
+
+    try:
+        with open(checkpoint, 'a', encoding='utf-8') as f:
+            await asyncio.gather(*(compute(cell, f) for cell in todo))
+    finally:
+        await close_client()
+
+    # 相同的建议只保存一次，格子里存下标
+    texts, text_index = [], {}
+    table = AdviceTable(signature, out_range, in_range, texts, [])
+    table.cells = [-1] * ((out_range[1] - out_range[0] + 1) * (in_range[1] - in_range[0] + 1))
+    for (k_out, k_in), advice in done.items():
+        if advice not in text_index:
+            text_index[advice] = len(texts)
+            texts.append(advice)
+        table.cells[table.index(k_out, k_in)] = text_index[advice]
+
+    tmp_path = f"{output}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(table.to_json(), f, ensure_ascii=False)
+    os.replace(tmp_path, output)
+    print(f"查找表已保存到 {output}（{len(texts)} 条不同建议）")
+
+    if failed:
+        print(f"有 {failed} 格失败，重新运行即可补全")
+    else:
+        os.remove(checkpoint)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="预计算着装建议查找表")
+    parser.add_argument("--output", default=ADVICE_TABLE_FILE, help="查找表输出路径")
+    parser.add_argument("--concurrency", type=int, default=ADVICE_PRECOMPUTE_CONCURRENCY,
+                        help="同时进行的模型请求数")
+    args = parser.parse_args()
+    if not args.output:
+        parser.error("请通过 --output 或 ADVICE_TABLE_FILE 指定查找表路径")
+    asyncio.run(precompute(args.output, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import cv2, threading, time
+import numpy as np
+
+from services.config import (
+    PRESENCE_FPS, PRESENCE_WIDTH, PRESENCE_PIXEL_DELTA, PRESENCE_MIN_RATIO, PRESENCE_BG_ALPHA,
+    PRESENCE_HOLD, PRESENCE_BUDGET_MS,
+)
+
+
+class MotionDetector:
+    """
+    帧差运动检测：在隔行隔列抽样得到的小灰度图上与滑动平均背景比较，
+    返回变化像素占比；抽样是数组视图，不复制整帧，开销与原始分辨率基本无关
+    """
+
+    def __init__(self, width=PRESENCE_WIDTH, pixel_delta=PRESENCE_PIXEL_DELTA, alpha=PRESENCE_BG_ALPHA):
+        self.width = width
+        self.pixel_delta = pixel_delta
+        self.alpha = alpha
+        self._background = None  # float32 灰度背景
+
+    def motion(self, frame):
+        step = max(1, frame.shape[1] // self.width)
+        small = frame[::step, ::step]
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else np.ascontiguousarray(small)
+        gray = cv2.GaussianBlur(gray, (3, 3), 0)  # 抑制传感器噪声
+        if self._background is None or self._background.shape != gray.shape:
+            self._background = gray.astype(np.float32)
+            return 0.0
+        diff = cv2.absdiff(gray, cv2.convertScaleAbs(self._background))
+        ratio = np.count_nonzero(diff > self.pixel_delta) / diff.size
+        # 光线缓慢变化被背景吸收，不会被当作有人
+        cv2.accumulateWeighted(gray, self._background, self.alpha)
+        return ratio
+
+
+class PresenceMonitor:
+    """
+    后台线程：每秒 fps 次向摄像头请求新帧并检测运动（需 drain 模式）
+    最近 hold 秒内有运动即认为有人，状态变化时调用 on_change(present)（在检测线程中调用）
+    单帧检测耗时超过 budget_ms 时自动降低检测频率，使 CPU 占用不超过 预算×fps
+    """
+
+    def __init__(self, camera, on_change=None, fps=PRESENCE_FPS, hold=PRESENCE_HOLD,
+                 min_ratio=PRESENCE_MIN_RATIO, budget_ms=PRESENCE_BUDGET_MS, detector=None):
+        self.camera = camera
+        self.on_change = on_change
+        self.fps = fps
+        self.hold = hold
+        self.min_ratio = min_ratio
+        self.budget_ms = budget_ms
+        self.detector = detector or MotionDetector()
+        self.present = False
+        self.last_motion = None   # time.monotonic()
+        self.cost_ms = None       # 单帧检测耗时（指数滑动平均，CPU时间）
+        self.interval = 1 / fps
+        self._stop = threading.Event()
+        self.t = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.t.start()
+        return self
+
+    def process(self, frame, now=None):
+        """检测一帧并更新状态，返回是否有人"""
+        now = time.monotonic() if now is None else now
+        start = time.thread_time()
+        ratio = self.detector.motion(frame)
+        cost = (time.thread_time() - start) * 1000
+        self.cost_ms = cost if self.cost_ms is None else 0.8 * self.cost_ms + 0.2 * cost
+        self.interval = max(1 / self.fps, self.cost_ms / self.budget_ms / self.fps)
+
+        if ratio >= self.min_ratio:
+            self.last_motion = now
+        self._set_present(self.last_motion is not None and now - self.last_motion <= self.hold)
+        return self.present
+
+    def _set_present(self, present):
+        if present != self.present:
+            self.present = present
+            if self.on_change is not None:
+                self.on_change(present)
+
+    def _run(self):
+        seen = 0
+        while not self._stop.wait(self.interval):
+            self.camera.request()
+            with self.camera.lock:
+                frame, frame_id = self.camera.frame, self.camera.frame_id
+            if frame is None or frame_id == seen:
+                # 没有新帧时仍需让“有人”状态按 hold 过期
+                if self.present and time.monotonic() - self.last_motion > self.hold:
+                    self._set_present(False)
+                continue
+            seen = frame_id
+            try:
+                self.process(frame)
+            except Exception as e:
+                print(f"运动检测失败: {e}")
+
+    def stop(self):
+        self._stop.set()
+        self.t.join(timeout=5)
+
@@ -0,0 +1,231 @@
+import asyncio
+import hashlib
+import json
+import time
+
+from services.cai_yun import fetch_realtime_weather, process_weather_data
+from services.get_db import get_recent_readings
+from services.clothes_suggest import ask_ai_async, cached_advice
+from services.config import REFRESH_INTERVAL, STALE_AFTER, LOCATIONS
+
+
+async def _timed(timings, stage, awaitable):
+    """等待 awaitable 完成，并把耗时（毫秒）记录到 timings[stage]"""
+    start = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        timings[stage] = round((time.perf_counter() - start) * 1000, 1)
+
+
+async def build_snapshot(location):
+    """
+    针对一个地点完整执行一次 预报/监测/建议 流水线，返回 /weather 所需的数据
+    location: LOCATIONS 中的一项
+    """
+    timings = {}
+    start = time.perf_counter()
+
+    # 彩云天气与本地数据库互不依赖，同时发起
+    d, m = await asyncio.gather(
+        _timed(timings, "caiyun", fetch_realtime_weather(location["longitude"], location["latitude"])),
+        _timed(timings, "db", asyncio.to_thread(get_recent_readings, 1, location.get("device_mac"))),
+    )
+    w = process_weather_data(d)
+    if not w or w.temperature is None:
+        raise RuntimeError("彩云天气数据获取失败")
+    if not m:
+        raise RuntimeError("数据库中暂无监测数据")
+    tw, tm = round(w.temperature, 1), round(m[0]['temperature'], 1)
+    # 两个温度都到齐后查询建议缓存；未命中时 advice 为 None，由刷新器随后补全
+    a = cached_advice(tw, tm)
+
+    timings["total"] = round((time.perf_counter() - start) * 1000, 1)
+    return {
+        "forecast": tw,
+        "monitor": tm,
+        "weather": w.local_intensity_desc,
+        "nearest": w.nearest_distance,
+        "rain": w.nearest_intensity_desc,
+        "advice": a,
+        "update": w.update_time,
+        "timings": timings
+    }
+
+
+# 推送给页面的字段；age/timings 每次都会变化，不推送
+PUSH_FIELDS = ("forecast", "monitor", "weather", "nearest", "rain", "advice", "update", "error", "present")
+
+
+class SnapshotRefresher:
+    """
+    后台定时重建各地点的 /weather 数据，请求只读取内存中的最新快照；
+    快照内容变化时通知 /events 的订阅者（所有连接共享同一份计算和编码结果）
+    """
+
+    def __init__(self, locations=LOCATIONS, interval=REFRESH_INTERVAL, stale_after=STALE_AFTER,
+                 builder=build_snapshot):
+        self.locations = locations
+        self.interval = interval
+        self.stale_after = stale_after
+        self.builder = builder
+        self.snapshots = {}    # 地点id -> 最近一次成功的快照
+        self.updated_at = {}   # 地点id -> 最近一次成功的时间（time.time()）
+        self.errors = {}       # 地点id -> 最近一次刷新失败的原因，成功后清空
+        self.ready = asyncio.Event()
+        self.versions = {}     # 地点id -> 推送内容的版本号，内容变化时加一
+        self._pushed = {}      # 地点id -> (版本号, 推送字段, 完整消息, 相对上一版本的增量消息)
+        self._digests = {}     # 地点id -> 推送字段的内容哈希（用作 ETag，与进程和版本号无关）
+        self._changed = asyncio.Event()
+        self.present = None    # 镜前是否有人；None 表示未启用检测，False 时暂停刷新
+        self._wake = asyncio.Event()
+        self._task = None
+
+    async def refresh(self):
+        """
+        重建所有地点的快照；各地点并发进行，坐标相同的天气请求由缓存合并为一次。
+        温度先发布，缺少的着装建议随后生成，不阻塞 /weather
+        """
+        try:
+            await asyncio.gather(*(self._refresh_one(i) for i in self.locations))
+        finally:
+            self.ready.set()
+        await asyncio.gather(*(self._complete_advice(i) for i in self.locations))
+
+    async def _refresh_one(self, location_id):
+        """重建一个地点的快照；失败时保留上一份成功的快照"""
+        try:
+            self.snapshots[location_id] = await self.builder(self.locations[location_id])
+            self.updated_at[location_id] = time.time()
+            self.errors.pop(location_id, None)
+        except Exception as e:
+            self.errors[location_id] = str(e)
+            print(f"刷新天气快照失败 ({location_id}): {e}")
+        self._publish(location_id)
+
+    async def _complete_advice(self, location_id):
+        """为缺少建议的快照生成建议（与 /advice/stream 共享同一次模型请求）"""
+        snapshot = self.snapshots.get(location_id)
+        if snapshot is None or snapshot["advice"] is not None:
+            return
+        timings = dict(snapshot["timings"])
+        try:
+            advice = await _timed(timings, "ai", ask_ai_async(snapshot["forecast"], snapshot["monitor"]))
+        except Exception as e:
+            print(f"生成着装建议失败 ({location_id}): {e}")
+            return
+        # 期间快照可能已被新一轮刷新替换
+        if self.snapshots.get(location_id) is snapshot:
+            self.snapshots[location_id] = dict(snapshot, advice=advice, timings=timings)
+            self._publish(location_id)
+
+    def _publish(self, location_id):
+        """推送字段有变化时生成新版本，完整消息与增量消息各只编码一次"""
+        snapshot = self.snapshots.get(location_id) or {}
+        fields = {name: snapshot.get(name) for name in PUSH_FIELDS}
+        fields["error"] = self.errors.get(location_id)
+        fields["present"] = self.present
+        previous = self._pushed.get(location_id)
+        old_fields = previous[1] if previous else {}
+        changes = {name: value for name, value in fields.items() if name not in old_fields or old_fields[name] != value}
+        if not changes:
+            return
+        version = self.versions.get(location_id, 0) + 1
+        self.versions[location_id] = version
+        encoded = json.dumps(fields, ensure_ascii=False, sort_keys=True).encode("utf-8")
+        self._digests[location_id] = hashlib.sha256(encoded).hexdigest()[:16]
+        self._pushed[location_id] = (
+            version,
+            fields,
+            json.dumps({"version": version, "full": True, "changes": fields}, ensure_ascii=False),
+            json.dumps({"version": version, "full": False, "changes": changes}, ensure_ascii=False),
+        )
+        # 唤醒当前所有订阅者，并为下一次变化准备新的事件
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self, location_id="default", keepalive=None):
+        """
+        订阅某地点推送内容的变化（异步生成器），产出已编码的 JSON 消息
+        首条为完整内容，之后只在内容变化时产出增量；订阅者落后多个版本时直接发送完整内容。
+        keepalive 秒内无变化时产出 None，调用方可借此发送心跳
+        """
+        seen = 0
+        while True:
+            # 先取事件再检查版本，产出消息期间发生的变化不会被漏掉
+            changed = self._changed
+            pushed = self._pushed.get(location_id)
+            if pushed is not None and pushed[0] != seen:
+                version, _, full, diff = pushed
+                yield diff if seen and version == seen + 1 else full
+                seen = version
+                continue
+            try:
+                await asyncio.wait_for(changed.wait(), keepalive)
+            except asyncio.TimeoutError:
+                yield None
+
+    def set_present(self, present):
+        """
+        更新有人检测结果（须在事件循环线程中调用）
+        无人时跳过定时刷新，不请求彩云天气与AI；有人到来时立即刷新，并推送给页面用于唤醒
+        """
+        if present == self.present:
+            return
+        arrived = present and self.present is not None
+        self.present = present
+        if arrived:
+            self._wake.set()
+        for location_id in self.snapshots:
+            self._publish(location_id)
+
+    async def _run(self):
+        while True:
+            # 刷新前清除唤醒标记，刷新期间有人到来时等待会立即返回，不会错过
+            self._wake.clear()
+            # 首次刷新总是执行，保证 /weather 有数据
+            if self.present is not False or not self.ready.is_set():
+                await self.refresh()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def etag(self, location_id="default"):
+        """
+        /weather 的弱 ETag：由推送内容的哈希与过期标记组成，内容不变时保持不变，
+        进程重启或多个 worker 之间也一致（age/timings 的变化不影响，因此为弱校验）；无快照时返回 None
+        """
+        if location_id not in self.snapshots or location_id not in self._digests:
+            return None
+        stale = time.time() - self.updated_at[location_id] > self.stale_after or location_id in self.errors
+        return f'W/"{self._digests[location_id]}-{int(stale)}"'
+
+    def latest(self, location_id="default"):
+        """返回某地点的最新快照及其时效信息"""
+        if location_id not in self.locations:
+            return {"error": f"未知地点: {location_id}"}
+        error = self.errors.get(location_id)
+        snapshot = self.snapshots.get(location_id)
+        if snapshot is None:
+            return {"error": error or "数据准备中", "stale": True}
+        age = round(time.time() - self.updated_at[location_id], 1)
+        result = dict(snapshot)
+        result["age"] = age
+        result["stale"] = age > self.stale_after or error is not None
+        if error is not None:
+            result["error"] = error
+        return result
@@ -0,0 +1,90 @@
+import json
+
+from LYWSD03MMC_db import (
+    AdvertisementFilter, parse_atc_advertisement, parse_bthome_advertisement, decode_advertisement,
+    replay_advertisements, BTHOME_SERVICE, ENVIRONMENTAL_SENSING_SERVICE,
+)
+
+MAC = "A4:C1:38:00:00:01"
+
+# 录制的服务数据（十六进制）
+# ATC1441（大端）: MAC, 温度 21.5°C, 湿度 45%, 电量 90%, 电压 2954mV, 帧计数 7
+ATC1441 = "a4c138000001" "00d7" "2d" "5a" "0b8a" "07"
+# pvvx（小端）: MAC(倒序), 温度 -1.23°C, 湿度 45.67%, 电压 2950mV, 电量 90%, 帧计数 42, 标志
+PVVX = "01000038c1a4" "85ff" "d711" "860b" "5a" "2a" "04"
+# BTHome v2 未加密: 帧计数 9, 电量 90%, 温度 25.06°C, 湿度 50.55%
+BTHOME = "40" "0009" "015a" "02ca09" "03bf13"
+
+
+def test_filter_drops_repeated_packet_id():
+    f = AdvertisementFilter(min_interval=30)
+    reading = {"temperature": 21.0, "humidity": 45.0, "packet_id": 7}
+    assert f.accept(MAC, reading, now=0)
+    # 同一帧被重复广播
+    assert not f.accept(MAC, dict(reading), now=1)
+    assert not f.accept(MAC, dict(reading), now=100)
+    # 帧计数变化，且已超过 min_interval
+    assert f.accept(MAC, dict(reading, packet_id=8), now=101)
+    # 帧计数变化但间隔不足
+    assert not f.accept(MAC, dict(reading, packet_id=9), now=110)
+
+def test_filter_without_packet_id_uses_min_interval():
+    f = AdvertisementFilter(min_interval=30)
+    reading = {"temperature": 21.0, "humidity": 45.0, "packet_id": None}
+    results = [f.accept(MAC, dict(reading), now=t) for t in (0, 31, 62, 93, 124)]
+    assert results == [True, True, True, True, True]
+    assert not f.accept(MAC, dict(reading), now=130)
+
+def test_parse_atc1441():
+    assert parse_atc_advertisement(bytes.fromhex(ATC1441)) == {
+        "temperature": 21.5, "humidity": 45.0, "battery": 90, "packet_id": 7}
+
+def test_parse_pvvx():
+    assert parse_atc_advertisement(bytes.fromhex(PVVX)) == {
+        "temperature": -1.23, "humidity": 45.67, "battery": 90, "packet_id": 42}
+
+def test_parse_atc_rejects_other_lengths():
+    assert parse_atc_advertisement(bytes.fromhex(ATC1441)[:-1]) is None
+    assert parse_atc_advertisement(bytes.fromhex(PVVX) + b"\x00") is None
+    assert parse_atc_advertisement(b"") is None
+
+def test_parse_bthome():
+    assert parse_bthome_advertisement(bytes.fromhex(BTHOME)) == {
+        "packet_id": 9, "battery": 90, "temperature": 25.06, "humidity": 50.55}
+
+def test_parse_bthome_malformed():
+    # 最后一个对象被截断
+    assert parse_bthome_advertisement(bytes.fromhex(BTHOME)[:-1]) is None
+    # 加密帧与非 v2 帧
+    assert parse_bthome_advertisement(bytes.fromhex("41" + BTHOME[2:])) is None
+    assert parse_bthome_advertisement(bytes.fromhex("20" + BTHOME[2:])) is None
+    # 缺少湿度
+    assert parse_bthome_advertisement(bytes.fromhex("40" "02ca09")) is None
+    # 未知对象ID之后的内容不再解析
+    assert parse_bthome_advertisement(bytes.fromhex("40" "02ca09" "ff" "03bf13")) is None
+    assert parse_bthome_advertisement(b"") is None
+
+def test_decode_advertisement():
+    reading = decode_advertisement(MAC, {BTHOME_SERVICE: bytes.fromhex(BTHOME)}, ts=1700000000000)
+    assert reading["device_mac"] == MAC
+    assert reading["ts"] == 1700000000000
+    assert reading["temperature"] == 25.06
+
+    reading = decode_advertisement(MAC, {ENVIRONMENTAL_SENSING_SERVICE: bytes.fromhex(PVVX)}, ts=1700000000000)
+    assert reading["temperature"] == -1.23
+    assert decode_advertisement(MAC, {ENVIRONMENTAL_SENSING_SERVICE: b"\x00" * 4}) is None
+    assert decode_advertisement(MAC, {"0000fe95-0000-1000-8000-00805f9b34fb": bytes.fromhex(PVVX)}) is None
+
+def test_replay_recorded_advertisements(tmp_path):
+    path = tmp_path / "adv.jsonl"
+    lines = [
+        {"ts": 1700000000000, "mac": MAC, "service_data": {ENVIRONMENTAL_SENSING_SERVICE: PVVX}},
+        # 同一帧被重复广播
+        {"ts": 1700000001000, "mac": MAC, "service_data": {ENVIRONMENTAL_SENSING_SERVICE: PVVX}},
+        # 无法解析的行与格式错误的数据
+        {"ts": 1700000002000, "mac": MAC, "service_data": {ENVIRONMENTAL_SENSING_SERVICE: "zz"}},
+        {"ts": 1700000100000, "mac": MAC, "service_data": {BTHOME_SERVICE: BTHOME}},
+    ]
+    path.write_text("\n".join(json.dumps(line) for line in lines) + "\n{\n", encoding="utf-8")
+    readings = replay_advertisements(str(path))
+    assert [(r["ts"], r["temperature"]) for r in readings] == [(1700000000000, -1.23), (1700000100000, 25.06)]
@@ -0,0 +1,37 @@
+import asyncio
+import time
+
+from services.cai_yun import ResponseCache
+
+
+def _fetcher(result, calls):
+    async def fetch():
+        calls.append(1)
+        return result
+    return fetch
+
+def test_stale_entry_served_while_refreshing():
+    async def run():
+        cache = ResponseCache(ttl=10, max_stale=60, path=None)
+        cache._entries["k"] = {"data": {"status": "ok", "v": 1}, "expires": time.time() - 5}
+        calls = []
+        data = await cache.get("k", _fetcher(None, calls))
+        await asyncio.sleep(0)
+        return data, calls
+    data, calls = asyncio.run(run())
+    assert data == {"status": "ok", "v": 1}
+    assert calls == [1]
+
+def test_entry_past_max_stale_not_returned_when_refetch_fails():
+    async def run():
+        cache = ResponseCache(ttl=10, max_stale=60, path=None)
+        cache._entries["k"] = {"data": {"status": "ok", "v": 1}, "expires": time.time() - 120}
+        return await cache.get("k", _fetcher(None, []))
+    assert asyncio.run(run()) is None
+
+def test_entry_past_max_stale_replaced_by_refetch():
+    async def run():
+        cache = ResponseCache(ttl=10, max_stale=60, path=None)
+        cache._entries["k"] = {"data": {"status": "ok", "v": 1}, "expires": time.time() - 120}
+        return await cache.get("k", _fetcher({"status": "ok", "v": 2, "server_time": time.time()}, []))
+    assert asyncio.run(run())["v"] == 2
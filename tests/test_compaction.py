@@ -0,0 +1,56 @@
+import contextlib
+import io
+
+import pytest
+
+from LYWSD03MMC_db import SensorDatabase
+from services.get_db import close_connections, get_connection, to_epoch_ms, LOCAL_OFFSET_MS
+
+MAC = "A4:C1:38:00:00:01"
+HOUR = 3600 * 1000
+DAY = 24 * HOUR
+
+
+@pytest.fixture
+def db(tmp_path):
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield SensorDatabase(str(tmp_path / "sensor_data.db"))
+    close_connections()
+
+def _reading(ts, temperature=20.0):
+    return {"ts": ts, "device_mac": MAC, "temperature": temperature, "humidity": 50.0, "battery": 90}
+
+def _bucket(db, tier, bucket):
+    return get_connection(db.db_path).execute(
+        f"SELECT count, temp_max FROM sensor_readings_{tier} WHERE bucket = ?", (bucket,)).fetchone()
+
+def test_backfill_keeps_buckets_built_from_purged_data(db):
+    # 40 天前某天 10 点的一小时内每分钟一条，超过原始表与1分钟层的保留期
+    day = (to_epoch_ms() - 40 * DAY + LOCAL_OFFSET_MS) // DAY * DAY - LOCAL_OFFSET_MS
+    hour = day + 10 * HOUR
+    db.save_readings([_reading(hour + i * 60000) for i in range(30)], compact=False)
+    db.compact()
+    assert _bucket(db, "1h", hour)["count"] == 30
+    assert get_connection(db.db_path).execute("SELECT COUNT(*) AS n FROM sensor_readings").fetchone()["n"] == 0
+
+    # 补录同一小时的一条（源数据已清理，已有的汇总不能被覆盖）和另一小时的一条（原来没有的桶）
+    db.save_readings([_reading(hour + 45 * 60000, 25.0), _reading(hour + 2 * HOUR, 22.0)], compact=False)
+    db.compact(since=hour)
+
+    assert _bucket(db, "1h", hour)["count"] == 30
+    assert _bucket(db, "1h", hour)["temp_max"] == 20.0
+    assert _bucket(db, "1h", hour + 2 * HOUR)["count"] == 1
+    # 1小时层仍完整保留这一天，1天层整体重新汇总
+    assert _bucket(db, "1d", day)["count"] == 31
+
+def test_backfill_rebuilds_buckets_still_covered(db):
+    hour = (to_epoch_ms() - 3 * DAY + LOCAL_OFFSET_MS) // HOUR * HOUR - LOCAL_OFFSET_MS
+    db.save_readings([_reading(hour + i * 60000) for i in range(10)], compact=False)
+    db.compact()
+    assert _bucket(db, "1h", hour)["count"] == 10
+
+    db.save_readings([_reading(hour + 30 * 60000, 25.0)], compact=False)
+    db.compact(since=hour + 30 * 60000)
+    assert _bucket(db, "1m", hour + 30 * 60000)["count"] == 1
+    assert _bucket(db, "1h", hour)["count"] == 11
+    assert _bucket(db, "1h", hour)["temp_max"] == 25.0
@@ -0,0 +1,47 @@
+from starlette.requests import Request
+
+from services import http_cache
+from services.config import COMPRESS_MIN_SIZE
+from services.http_cache import Representation, choose_encoding, respond
+
+
+def test_choose_encoding_prefers_listed_codings(monkeypatch):
+    monkeypatch.setattr(http_cache, "brotli", None)
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("*") == "gzip"
+    assert choose_encoding("identity") is None
+    assert choose_encoding(None) is None
+
+def test_choose_encoding_explicit_q0_overrides_wildcard(monkeypatch):
+    monkeypatch.setattr(http_cache, "brotli", None)
+    assert choose_encoding("gzip;q=0, *") is None
+    assert choose_encoding("*;q=0, gzip") == "gzip"
+    assert choose_encoding("*;q=0") is None
+
+    # 安装了 brotli 时，明确拒绝 br 则回退到 gzip
+    monkeypatch.setattr(http_cache, "brotli", object())
+    assert choose_encoding("br;q=0, *") == "gzip"
+    assert choose_encoding("br;q=0, gzip;q=0, *") is None
+    assert choose_encoding("*") == "br"
+
+def _request(**headers):
+    return Request({"type": "http", "headers": [(k.replace("_", "-").encode(), v.encode()) for k, v in headers.items()]})
+
+def test_strong_etag_differs_per_encoding(monkeypatch):
+    monkeypatch.setattr(http_cache, "brotli", None)
+    representation = Representation(b"x" * (COMPRESS_MIN_SIZE + 1), '"abc"', "text/html")
+
+    identity = respond(_request(), representation, "no-cache")
+    gzipped = respond(_request(accept_encoding="gzip"), representation, "no-cache")
+    assert identity.headers["etag"] == '"abc"'
+    assert gzipped.headers["etag"] == '"abc-gzip"'
+    assert gzipped.headers["content-encoding"] == "gzip"
+
+    # 各版本的 ETag 只匹配对应的编码
+    assert respond(_request(accept_encoding="gzip", if_none_match='"abc-gzip"'), representation,
+                   "no-cache").status_code == 304
+    assert respond(_request(if_none_match='"abc-gzip"'), representation, "no-cache").status_code == 200
+
+def test_weak_etag_shared_across_encodings():
+    representation = Representation(b"x" * (COMPRESS_MIN_SIZE + 1), 'W/"abc-0"', "application/json")
+    assert representation.etag_for("gzip") == representation.etag_for(None) == 'W/"abc-0"'
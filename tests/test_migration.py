@@ -0,0 +1,129 @@
+import contextlib
+import io
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from LYWSD03MMC_db import SensorDatabase
+from services import get_db
+from services.get_db import close_connections, init_schema
+
+# 改造前（ISO-8601 文本时间）的表结构
+BASELINE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS sensor_readings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    device_mac TEXT NOT NULL,
+    temperature REAL,
+    humidity REAL,
+    battery INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_timestamp ON sensor_readings(timestamp);
+'''
+
+ROWS = [
+    ("2024-01-15T08:30:00", "A4:C1:38:00:00:01", 20.5, 45.0, 90),
+    ("2024-01-15T08:31:00.250000", "A4:C1:38:00:00:01", 20.7, 45.5, 90),
+    ("2024-01-15T08:30:30", "A4:C1:38:00:00:02", 18.0, 60.0, 80),
+    ("2024-01-15T08:29:30", "A4:C1:38:00:00:02", 17.5, 61.0, 81),
+]
+
+
+def _ms(text):
+    # 旧数据按本地时间保存
+    return round(datetime.fromisoformat(text).timestamp() * 1000)
+
+def _baseline_database(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.executescript(BASELINE_SCHEMA)
+    with conn:
+        conn.executemany('''
+        INSERT INTO sensor_readings (timestamp, device_mac, temperature, humidity, battery)
+        VALUES (?, ?, ?, ?, ?)
+        ''', ROWS)
+    conn.close()
+
+def _tables(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    finally:
+        conn.close()
+
+def test_migrate_baseline_schema(tmp_path):
+    db_path = str(tmp_path / "sensor_data.db")
+    _baseline_database(db_path)
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            SensorDatabase(db_path)
+    finally:
+        close_connections()
+
+    conn = sqlite3.connect(db_path)
+    try:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == 1
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(sensor_readings)")]
+        assert "ts" in columns and "timestamp" not in columns
+
+        readings = conn.execute(
+            "SELECT id, ts, device_mac, temperature FROM sensor_readings ORDER BY id").fetchall()
+        assert len(readings) == len(ROWS)
+        assert [(ts, mac, temp) for _, ts, mac, temp in readings] == \
+            [(_ms(text), mac, temp) for text, mac, temp, _, _ in ROWS]
+
+        # 每台设备一行，取时间最新的读数（而非最后插入的）
+        latest = conn.execute(
+            "SELECT device_mac, ts, temperature, humidity, battery FROM sensor_latest ORDER BY device_mac").fetchall()
+        assert latest == [
+            ("A4:C1:38:00:00:01", _ms(ROWS[1][0]), 20.7, 45.5, 90),
+            ("A4:C1:38:00:00:02", _ms(ROWS[2][0]), 18.0, 60.0, 80),
+        ]
+
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        assert not any(name.endswith("_legacy") for name in tables)
+    finally:
+        conn.close()
+
+def test_failed_migration_rolls_back(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "sensor_data.db")
+    _baseline_database(db_path)
+
+    def fail(conn):
+        raise sqlite3.OperationalError("injected")
+    # 旧表已改名之后失败
+    monkeypatch.setattr(get_db, "_create_tables", fail)
+    with contextlib.redirect_stdout(io.StringIO()), pytest.raises(sqlite3.OperationalError):
+        init_schema(db_path)
+    assert _tables(db_path) == {"sensor_readings", "sqlite_sequence"}
+
+    monkeypatch.undo()
+    with contextlib.redirect_stdout(io.StringIO()):
+        init_schema(db_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM sensor_readings WHERE ts IS NOT NULL").fetchone()[0] == len(ROWS)
+    finally:
+        conn.close()
+
+def test_resume_interrupted_migration(tmp_path):
+    db_path = str(tmp_path / "sensor_data.db")
+    _baseline_database(db_path)
+    # 旧版本迁移中断后留下的状态：旧表已改名，新表已创建但没有数据
+    conn = sqlite3.connect(db_path)
+    conn.execute("ALTER TABLE sensor_readings RENAME TO sensor_readings_legacy")
+    conn.execute("CREATE TABLE sensor_readings (id INTEGER PRIMARY KEY AUTOINCREMENT, ts INTEGER NOT NULL, "
+                 "device_mac TEXT NOT NULL, temperature REAL, humidity REAL, battery INTEGER)")
+    conn.commit()
+    conn.close()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        init_schema(db_path)
+    assert not any(name.endswith("_legacy") for name in _tables(db_path))
+    conn = sqlite3.connect(db_path)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM sensor_readings").fetchone()[0] == len(ROWS)
+        assert conn.execute("SELECT COUNT(*) FROM sensor_latest").fetchone()[0] == 2
+    finally:
+        conn.close()